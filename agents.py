@@ -5,11 +5,30 @@ Generates real, platform-specific content
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from types import MappingProxyType
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 import re
 
+# Platform-specific instructions, built once at import (read-only)
+PLATFORM_GUIDES = MappingProxyType({
+    "LinkedIn": "Professional, business-focused, 150-300 words, industry insights, thought leadership. Use a professional tone with data-driven insights.",
+    "Twitter": "Concise, engaging, under 280 characters, conversational, use 1-2 relevant emojis. Focus on key takeaways and conversation starters.",
+    "Instagram": "Visual-first, engaging storytelling, 100-150 words, use emojis, ask questions. Write for a visual platform with emphasis on aesthetics.",
+    "Facebook": "Community-focused, conversational, 100-200 words, encourage comments and shares. Focus on community engagement and discussion.",
+    "Blog": "In-depth, detailed, 300-500 words, educational, include subheadings. Provide comprehensive analysis and actionable insights."
+})
+
+OPTIMAL_POST_TIMES = MappingProxyType({
+    "LinkedIn": "8:30 AM",
+    "Twitter": "12:00 PM",
+    "Instagram": "5:00 PM",
+    "Facebook": "9:00 AM",
+    "Blog": "10:00 AM"
+})
+
 @dataclass
 class BrandVoice:
     company_name: str
@@ -26,6 +45,16 @@ class ContentAgent:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
         self.base_url = "https://api.groq.com/openai/v1"
+        
+        # One keep-alive session per agent, so generations reuse the TLS connection
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        # The agent is shared by every Streamlit session, so keep enough
+        # pooled connections for concurrent generations
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
         print(f"✓ Agent initialized for {self.base_url}")
     
     def generate_content(self, platform: str, topic: str, brand_voice: BrandVoice,
@@ -135,16 +164,7 @@ class ContentAgent:
                               call_to_action: str) -> str:
         """Build comprehensive prompt with ALL parameters"""
         
-        # Platform-specific instructions
-        platform_guides = {
-            "LinkedIn": "Professional, business-focused, 150-300 words, industry insights, thought leadership. Use a professional tone with data-driven insights.",
-            "Twitter": "Concise, engaging, under 280 characters, conversational, use 1-2 relevant emojis. Focus on key takeaways and conversation starters.",
-            "Instagram": "Visual-first, engaging storytelling, 100-150 words, use emojis, ask questions. Write for a visual platform with emphasis on aesthetics.",
-            "Facebook": "Community-focused, conversational, 100-200 words, encourage comments and shares. Focus on community engagement and discussion.",
-            "Blog": "In-depth, detailed, 300-500 words, educational, include subheadings. Provide comprehensive analysis and actionable insights."
-        }
-        
-        platform_guide = platform_guides.get(platform, "Professional social media post")
+        platform_guide = PLATFORM_GUIDES.get(platform, "Professional social media post")
         
         # Build prompt parts
         prompt_parts = [
@@ -201,11 +221,6 @@ class ContentAgent:
     def _call_groq_api(self, prompt: str) -> str:
         """Call Groq API with error handling"""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
         # Using llama-3.3-70b-versatile as requested
         payload = {
             "messages": [
@@ -228,9 +243,8 @@ class ContentAgent:
         print(f"   Using model: {payload['model']}")
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
                 json=payload,
                 timeout=30
             )
@@ -263,11 +277,4 @@ class ContentAgent:
     
     def _get_optimal_time(self, platform: str) -> str:
         """Get optimal posting time based on platform"""
-        times = {
-            "LinkedIn": "8:30 AM",
-            "Twitter": "12:00 PM", 
-            "Instagram": "5:00 PM",
-            "Facebook": "9:00 AM",
-            "Blog": "10:00 AM"
-        }
-        return times.get(platform, "10:00 AM")
+        return OPTIMAL_POST_TIMES.get(platform, "10:00 AM")
@@ -3,33 +3,45 @@ Production AI Content Agent - Complete Implementation
 """
 
 import streamlit as st
-import time
+from streamlit.errors import StreamlitAPIException
+import threading
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from collections import defaultdict
+from dataclasses import replace
 from datetime import datetime, timedelta
+from io import BytesIO
 from typing import Dict, List
-import json
 import os
 
-# Import our production modules
-from agents import ContentAgent, BrandVoice
-from workflow import ApprovalWorkflow, ContentState
-from safety import SafetyController, SystemMode
-from database import ContentDatabase
+from apscheduler.schedulers.background import BackgroundScheduler
+from PIL import Image
+import pyarrow as pa
 
 # ========== SIMPLE SCHEDULER ==========
+# Safety modes in which nothing may be published
+HALTED_MODES = {"crisis_mode", "emergency_stop"}
+
 class PostingScheduler:
-    def __init__(self, database):
+    def __init__(self, database, safety, poll_seconds: int = 30):
         self.db = database
-        self.scheduled = []
+        self.safety = safety
+        
+        # Publish due posts from a background thread, whether or not a page is open
+        self.background = BackgroundScheduler(daemon=True)
+        self.background.add_job(self.simulate_posting, "interval", seconds=poll_seconds,
+                                id="publish_due_posts", max_instances=1, coalesce=True)
+    
+    def start(self):
+        """Start the background publishing job"""
+        self.background.start()
     
     def schedule_content(self, content_id, schedule_time):
         """Schedule content for posting"""
-        self.db.update_status(content_id, "scheduled")
-        
-        self.scheduled.append({
-            "content_id": content_id,
-            "scheduled_time": schedule_time,
-            "status": "pending"
-        })
+        self.db.schedule_content(content_id, schedule_time)
         
         return {
             "success": True,
@@ -39,19 +51,21 @@ class PostingScheduler:
     
     def get_scheduled_posts(self):
         """Get all scheduled posts"""
-        return self.scheduled
+        return self.db.get_scheduled_posts()
     
     def simulate_posting(self):
         """Simulate posting due content"""
-        now = datetime.now()
-        posted = []
+        # A pause or crisis holds every due post until operations resume
+        if self.safety.emergency_stop or self.safety.mode.value in HALTED_MODES:
+            return []
         
-        for post in self.scheduled[:]:
-            if post['scheduled_time'] <= now and post['status'] == 'pending':
-                post['status'] = 'posted'
-                post['posted_at'] = now
-                self.db.update_status(post['content_id'], 'published')
-                posted.append(post)
+        # Claim and publish in one transaction, so a failure can't leave a
+        # post marked posted while its content is still scheduled
+        with self.db.transaction():
+            posted = self.db.claim_due_posts(datetime.now())
+            
+            if posted:
+                self.db.update_status_many([p['content_id'] for p in posted], 'published')
         
         return posted
 
@@ -64,9 +78,38 @@ st.set_page_config(
 )
 
 # ========== SYSTEM INITIALIZATION ==========
-@st.cache_resource
+def _start_workflow_logging():
+    """Send workflow log records to stdout from a listener thread
+    
+    Approvals and notifications only enqueue the record, so they never
+    wait on stdout. Called from init_system, which Streamlit re-runs if a
+    previous attempt raised, so an installed handler is left as it is.
+    """
+    workflow_logger = logging.getLogger("workflow")
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in workflow_logger.handlers):
+        return
+    
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    
+    workflow_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    workflow_logger.setLevel(logging.INFO)
+    workflow_logger.propagate = False
+    
+    listener.start()
+    atexit.register(listener.stop)
+
+@st.cache_resource(show_spinner="Booting system...")
 def init_system():
     """Initialize all system components"""
+    # Production modules are imported here so the page can paint before they load
+    from agents import ContentAgent, BrandVoice
+    from workflow import ApprovalWorkflow
+    from safety import SafetyController
+    from database import ContentDatabase
+    
+    _start_workflow_logging()
+    
     # Brand voice configuration
     brand_voice = BrandVoice(
         company_name="40 Analytics",
@@ -85,17 +128,14 @@ def init_system():
     api_key = os.environ.get("GROQ_API_KEY") or os.environ.get("GROK_API_KEY")
     agent = ContentAgent(api_key=api_key)
     
-    # Pass agent to workflow
-    workflow = ApprovalWorkflow(db, ai_agent=agent)
+    # Pass agent to workflow; its revisions share the generation limit
+    workflow = ApprovalWorkflow(db, ai_agent=agent, generation_gate=_generation_gate())
     
-    scheduler = PostingScheduler(db)
-    
-    if not api_key:
-        st.sidebar.warning(" Set GROQ_API_KEY environment variable for AI generation")
-    else:
-        st.sidebar.success(" Groq API key loaded")
+    scheduler = PostingScheduler(db, safety)
+    scheduler.start()
     
     return {
+        "api_key_loaded": bool(api_key),
         "brand": brand_voice,
         "db": db,
         "safety": safety,
@@ -104,9 +144,100 @@ def init_system():
         "agent": agent
     }
 
+@st.cache_resource(show_spinner=False)
+def _generation_gate():
+    """Process-wide limit on concurrent AI generation calls"""
+    return threading.BoundedSemaphore(int(os.environ.get("MAX_CONCURRENT_GENS", "2")))
+
 # Initialize system
 system = init_system()
 
+# ========== CACHED QUERIES ==========
+# Status queues listed by the tabs, with a newest-N cap for each (None = all)
+QUEUE_LIMITS = {"pending_approval": None, "approved": 100}
+
+@st.cache_data(ttl=5)
+def _q_queues():
+    # Bodies are only previewed (300 chars + one to detect truncation)
+    return system["db"].get_content_by_statuses(QUEUE_LIMITS, preview_len=301)
+
+@st.cache_data(ttl=5)
+def _q_scheduled_between(start, end):
+    return system["db"].get_scheduled_between(start, end)
+
+@st.cache_data(max_entries=512)
+def _safety_check(text):
+    return system["safety"].check_content(text)
+
+# The change token only counts this process's writes; the TTL picks up
+# writes from other processes (scheduler job, other workers, CLI)
+@st.cache_data(max_entries=4, ttl=5)
+def _q_stats(change_token):
+    return system["db"].get_system_stats()
+
+@st.cache_data(max_entries=4, ttl=5)
+def _q_recent(limit, change_token, preview_len=None):
+    return system["db"].get_recent_content(limit=limit, preview_len=preview_len)
+
+@st.cache_data(max_entries=4, ttl=5)
+def _q_monitor(activity_limit, change_token):
+    """Monitor snapshot plus its rendered timeline, reused until the data changes or 5s pass"""
+    snapshot = system["db"].get_monitor_snapshot(activity_limit=activity_limit)
+    snapshot["timeline"] = "\n\n".join(
+        f"**{activity['timestamp'][11:16] if activity['timestamp'] else '--:--'}** - "
+        f"{activity['action']}: {activity['details'][:50]}..."
+        for activity in snapshot["activities"]
+    )
+    return snapshot
+
+@st.cache_data(ttl=5)
+def _q_revisions(content_id):
+    return system["db"].get_revisions_of_content(content_id)
+
+def _rerun_fragment():
+    """Rerun only the calling fragment, or the whole app during a full run"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def _queue_table(queue, key):
+    """Render a content queue as one selectable table, returning the selected item"""
+    selection = st.dataframe(
+        [{"ID": item['id'], "Platform": item['platform'], "Topic": item['topic'][:60],
+          "Created": item['created_at']} for item in queue],
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=key
+    )
+    rows = [row for row in selection.selection.rows if row < len(queue)]
+    return queue[rows[0]] if rows else None
+
+@st.cache_data(max_entries=64)
+def _thumbnail(file_id, _file):
+    """Downscale an uploaded image once so reruns send KBs, not the original
+    
+    Keyed on the upload's file_id; the file itself is read in place rather
+    than copied out and hashed on every rerun.
+    """
+    _file.seek(0)
+    image = Image.open(_file)
+    image.thumbnail((300, 300))
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+def _invalidate_queries():
+    """Drop cached reads after a write so the next rerun sees it"""
+    _q_queues.clear()
+    _q_scheduled_between.clear()
+    _q_stats.clear()
+    _q_recent.clear()
+    _q_monitor.clear()
+    _q_revisions.clear()
+
 # ========== SESSION STATE ==========
 if 'selected_tab' not in st.session_state:
     st.session_state.selected_tab = "create"
@@ -114,18 +245,81 @@ if 'emergency_mode' not in st.session_state:
     st.session_state.emergency_mode = False
 if 'current_content_id' not in st.session_state:
     st.session_state.current_content_id = None
-if 'refresh_needed' not in st.session_state:
-    st.session_state.refresh_needed = False
+if 'pending_decisions' not in st.session_state:
+    st.session_state.pending_decisions = {}
+if 'brand_overrides' not in st.session_state:
+    st.session_state.brand_overrides = {}
 
-# Force refresh if needed
-if st.session_state.refresh_needed:
-    st.session_state.refresh_needed = False
-    st.rerun()
+def _session_brand():
+    """This session's brand voice: the shared default plus its own overrides"""
+    overrides = st.session_state.brand_overrides
+    return replace(system["brand"], **overrides) if overrides else system["brand"]
 
 # ========== SIDEBAR - CONTROL PANEL ==========
+@st.fragment(run_every="10s")
+def system_status_panel():
+    """Sidebar metrics, refreshed on their own timer"""
+    # Get stats from database
+    stats = _q_stats(system["db"].change_token())
+    
+    st.metric("Pending Approval", stats.get("pending_approval", 0))
+    st.metric("Scheduled", stats.get("scheduled", 0))
+    st.metric("Published", stats.get("published", 0))
+    st.metric("AI Generations", stats.get("generated", 0))
+
+@st.fragment
+def settings_panel():
+    """Mode and brand settings; edits apply via callbacks, so only this panel reruns"""
+    # System Mode
+    st.divider()
+    st.subheader(" System Mode")
+    
+    def _apply_mode():
+        system["safety"].set_mode(st.session_state.mode.lower().replace(" ", "_"))
+    
+    # Only applied when the selection changes, so a rerun can't undo a pause or crisis mode
+    st.selectbox(
+        "Operation Mode",
+        ["Manual Review", "AI Draft Only", "Supervised Auto", "Full Automation"],
+        index=0,
+        key="mode",
+        on_change=_apply_mode,
+        help="Manual: All actions require approval\nAI Draft: AI creates drafts only\nSupervised: AI drafts + auto-schedule after approval\nFull: End-to-end automation"
+    )
+    
+    # Brand Configuration
+    st.divider()
+    st.subheader(" Brand Voice")
+    
+    # Edits stay in this session; the shared system brand is never modified
+    def _apply_brand(field, key, convert=str):
+        st.session_state.brand_overrides[field] = convert(st.session_state[key])
+    
+    def _lines(text):
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    
+    brand = _session_brand()
+    with st.expander("Configure Brand", expanded=False):
+        st.text_input("Company Name", value=brand.company_name, key="brand_company",
+                      on_change=_apply_brand, args=("company_name", "brand_company"))
+        tones = ["Professional", "Casual", "Technical", "Inspirational", "Educational"]
+        current_tone = brand.tone.capitalize()
+        st.selectbox("Tone", tones, index=tones.index(current_tone) if current_tone in tones else 0,
+                     key="brand_tone", on_change=_apply_brand, args=("tone", "brand_tone", str.lower))
+        st.text_area("Target Audience", value=brand.target_audience, key="brand_audience",
+                     on_change=_apply_brand, args=("target_audience", "brand_audience"))
+        st.text_area("Key Messages", value="\n".join(brand.content_pillars), key="brand_messages",
+                     on_change=_apply_brand, args=("content_pillars", "brand_messages", _lines))
+
 with st.sidebar:
     st.title("Control Panel")
     
+    # Reported from the cached init result rather than from inside init_system
+    if not system["api_key_loaded"]:
+        st.warning(" Set GROQ_API_KEY environment variable for AI generation")
+    else:
+        st.success(" Groq API key loaded")
+    
     # Emergency Controls
     st.subheader(" Safety Controls")
     
@@ -134,58 +328,30 @@ with st.sidebar:
         if st.button(" Pause All", type="secondary"):
             system["safety"].emergency_pause("Manual pause activated")
             st.session_state.emergency_mode = True
-            st.error("All automation paused!")
-            time.sleep(1)
+            st.toast("All automation paused!", icon="⛔")
             st.rerun()
     
     with col2:
         if st.button(" Resume", disabled=not st.session_state.emergency_mode):
             system["safety"].resume_operations()
             st.session_state.emergency_mode = False
-            st.success("System resumed!")
-            time.sleep(1)
+            st.toast("System resumed!", icon="✅")
             st.rerun()
     
-    # System Mode
-    st.divider()
-    st.subheader(" System Mode")
-    
-    mode = st.selectbox(
-        "Operation Mode",
-        ["Manual Review", "AI Draft Only", "Supervised Auto", "Full Automation"],
-        index=0,
-        help="Manual: All actions require approval\nAI Draft: AI creates drafts only\nSupervised: AI drafts + auto-schedule after approval\nFull: End-to-end automation"
-    )
-    
-    # Update system mode
-    system["safety"].set_mode(mode.lower().replace(" ", "_"))
-    
-    # Brand Configuration
-    st.divider()
-    st.subheader(" Brand Voice")
-    
-    with st.expander("Configure Brand", expanded=False):
-        st.text_input("Company Name", value=system["brand"].company_name)
-        st.selectbox("Tone", ["Professional", "Casual", "Technical", "Inspirational"])
-        st.text_area("Target Audience", value=system["brand"].target_audience)
-        st.text_area("Key Messages", value="\n".join(system["brand"].content_pillars))
+    settings_panel()
     
     # System Status
     st.divider()
     st.subheader(" System Status")
-    
-    # Get stats from database
-    stats = system["db"].get_system_stats()
-    
-    st.metric("Pending Approval", stats.get("pending_approval", 0))
-    st.metric("Scheduled", stats.get("scheduled", 0))
-    st.metric("Published", stats.get("published", 0))
-    st.metric("AI Generations", stats.get("generated", 0))
+    system_status_panel()
 
 # ========== MAIN DASHBOARD ==========
 st.title(" AI Content Agent - Production System")
 st.caption("Enterprise-grade AI automation with human-in-the-loop controls")
 
+# Review and Approve tabs both list content pending approval
+pending_approval = _q_queues()["pending_approval"]
+
 # Tabs with proper workflow
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     " Create", 
@@ -195,53 +361,118 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
     " Monitor"
 ])
 
+# ========== RECENT DRAFTS PANEL ==========
+@st.fragment(run_every=10)
+def recent_drafts_panel():
+    """Recent drafts list, refreshed independently of the creation form"""
+    st.header("Recent Drafts & Revisions")
+    
+    # Show recent AI-generated content
+    recent_drafts = _q_recent(10, system["db"].change_token(), preview_len=200)
+    
+    if not recent_drafts:
+        st.info("No drafts yet. Create your first AI content!")
+    else:
+        # One Arrow table for the list; details only for the selected draft
+        selection = st.dataframe(
+            [{"ID": draft['id'], "Platform": draft['platform'], "Topic": draft['topic'][:40],
+              "Status": draft['status'], "Revision of": str(draft['metadata'].get('revision_of', '')),
+              "Created": draft['created_at']} for draft in recent_drafts],
+            hide_index=True,
+            use_container_width=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="recent_drafts_table"
+        )
+        rows = [row for row in selection.selection.rows if row < len(recent_drafts)]
+        
+        if rows:
+            draft = recent_drafts[rows[0]]
+            metadata = draft['metadata']
+            
+            # Handle content display
+            content_to_show = draft.get('content', '')
+            if isinstance(content_to_show, dict):
+                content_to_show = content_to_show.get('content', 'No content')
+            
+            st.write(content_to_show[:200] + "...")
+            st.caption(f"Status: {draft['status']} | ID: {draft['id']} | Created: {draft['created_at']}")
+            
+            if 'revision_of' in metadata:
+                revision_info = f" Revision of #{metadata['revision_of']}"
+                if 'revision_notes' in metadata:
+                    revision_info += f" - {metadata['revision_notes'][:30]}..."
+                st.info(revision_info)
+            
+            if draft['status'] == 'draft':
+                col_x, col_y = st.columns(2)
+                with col_x:
+                    if st.button("Edit", key=f"edit_{draft['id']}"):
+                        st.session_state.current_content_id = draft['id']
+                        st.session_state.selected_tab = "approve"
+                        st.rerun()
+                with col_y:
+                    if st.button("Submit", key=f"submit_{draft['id']}"):
+                        system["workflow"].submit_for_approval(draft['id'])
+                        _invalidate_queries()
+                        st.toast("Submitted!", icon="✅")
+                        st.rerun()
+        else:
+            st.caption("Select a draft to preview it")
+
 # ========== TAB 1: AI CONTENT CREATION ==========
-with tab1:
+@st.fragment
+def render_create_tab():
+    """Content creation tab"""
     col1, col2 = st.columns([2, 1])
     
     with col1:
         st.header("AI Content Creation")
         
-        # Platform selection with platform-specific guidance
-        platform = st.selectbox(
-            "Select Platform",
-            ["LinkedIn", "Twitter", "Instagram", "Facebook"],
-            help="Content will be optimized for selected platform"
-        )
+        # Inputs are batched in a form so they only rerun the script on submit
+        with st.form("generate_form", clear_on_submit=False):
+            # Platform selection with platform-specific guidance
+            platform = st.selectbox(
+                "Select Platform",
+                ["LinkedIn", "Twitter", "Instagram", "Facebook"],
+                help="Content will be optimized for selected platform"
+            )
         
-        # Topic input with suggestions
-        topic = st.text_area(
-            "Content Brief",
-            height=100,
-            placeholder="Describe what you want to post about...\nExample: 'The impact of AI on data analytics workflows'",
-            help="Be specific for better AI generation"
-        )
+            # Topic input with suggestions
+            topic = st.text_area(
+                "Content Brief",
+                height=100,
+                placeholder="Describe what you want to post about...\nExample: 'The impact of AI on data analytics workflows'",
+                help="Be specific for better AI generation"
+            )
         
-        # Advanced options
-        with st.expander(" Advanced Options"):
-            col_a, col_b = st.columns(2)
-            with col_a:
-                tone = st.selectbox(
-                    "Specific Tone",
-                    ["Default", "Excited", "Educational", "Thought Leadership", "Promotional"]
-                )
-                include_hashtags = st.checkbox("Generate Hashtags", value=True)
-            with col_b:
-                include_question = st.checkbox("Add Engagement Question", value=True)
-                call_to_action = st.selectbox(
-                    "Call to Action",
-                    ["None", "Learn More", "Sign Up", "Download", "Comment"]
-                )
+            # Advanced options
+            with st.expander(" Advanced Options"):
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    tone = st.selectbox(
+                        "Specific Tone",
+                        ["Default", "Excited", "Educational", "Thought Leadership", "Promotional"]
+                    )
+                    include_hashtags = st.checkbox("Generate Hashtags", value=True)
+                with col_b:
+                    include_question = st.checkbox("Add Engagement Question", value=True)
+                    call_to_action = st.selectbox(
+                        "Call to Action",
+                        ["None", "Learn More", "Sign Up", "Download", "Comment"]
+                    )
         
-        # Media Upload Section
-        st.subheader(" Media Assets")
+            # Media Upload Section
+            st.subheader(" Media Assets")
         
-        uploaded_files = st.file_uploader(
-            "Upload images/videos for this post",
-            type=['jpg', 'jpeg', 'png', 'mp4', 'mov'],
-            accept_multiple_files=True,
-            help="AI will incorporate context from uploaded media"
-        )
+            uploaded_files = st.file_uploader(
+                "Upload images/videos for this post",
+                type=['jpg', 'jpeg', 'png', 'mp4', 'mov'],
+                accept_multiple_files=True,
+                help="AI will incorporate context from uploaded media"
+            )
+            
+            submitted = st.form_submit_button(" Generate AI Content", type="primary")
         
         if uploaded_files:
             st.success(f" {len(uploaded_files)} file(s) uploaded")
@@ -249,13 +480,13 @@ with tab1:
             for idx, file in enumerate(uploaded_files[:3]):
                 with cols[idx % 3]:
                     if file.type.startswith('image'):
-                        st.image(file, width=150)
+                        st.image(_thumbnail(file.file_id, file), width=150)
                     else:
                         st.video(file)
                     st.caption(file.name[:20])
         
-        # Generate button with confirmation
-        if st.button(" Generate AI Content", type="primary"):
+        # Generate on form submit
+        if submitted:
             if not topic:
                 st.error("Please enter a content brief")
             else:
@@ -270,13 +501,20 @@ with tab1:
                             "media_files": uploaded_files if uploaded_files else None
                         }
                         
-                        # Generate content using AI agent
-                        result = system["agent"].generate_content(
-                            platform=platform,
-                            topic=topic,
-                            brand_voice=system["brand"],
-                            **advanced_options
-                        )
+                        # Generate content using AI agent, bounded across sessions
+                        gate = _generation_gate()
+                        if not gate.acquire(blocking=False):
+                            with st.spinner(" Waiting for a generation slot..."):
+                                gate.acquire()
+                        try:
+                            result = system["agent"].generate_content(
+                                platform=platform,
+                                topic=topic,
+                                brand_voice=_session_brand(),
+                                **advanced_options
+                            )
+                        finally:
+                            gate.release()
                         
                         # Store in database
                         content_id = system["db"].create_content(
@@ -318,9 +556,8 @@ with tab1:
                         with col_a:
                             if st.button(" Submit for Approval", use_container_width=True):
                                 system["workflow"].submit_for_approval(content_id)
-                                st.success("Submitted to approval queue!")
-                                st.session_state.refresh_needed = True
-                                time.sleep(1)
+                                _invalidate_queries()
+                                st.toast("Submitted to approval queue!", icon="✅")
                                 st.rerun()
                         with col_b:
                             if st.button(" Edit & Resubmit", use_container_width=True):
@@ -328,132 +565,74 @@ with tab1:
                         with col_c:
                             if st.button(" Discard", use_container_width=True, type="secondary"):
                                 system["db"].update_status(content_id, "discarded")
-                                st.info("Content discarded")
-                                st.session_state.refresh_needed = True
-                                time.sleep(1)
-                                st.rerun()
+                                _invalidate_queries()
+                                st.toast("Content discarded")
+                                # Discarded drafts only appear in this tab
+                                _rerun_fragment()
                                 
                     except Exception as e:
                         st.error(f" AI Generation failed: {str(e)}")
                         st.info("Please check your GROQ_API_KEY environment variable and try again.")
     
     with col2:
-        st.header("Recent Drafts & Revisions")
-        
-        # Show recent AI-generated content
-        recent_drafts = system["db"].get_recent_content(limit=10)
-        
-        if not recent_drafts:
-            st.info("No drafts yet. Create your first AI content!")
-        else:
-            for draft in recent_drafts:
-                # Check if this is a revision
-                is_revision = False
-                revision_info = ""
-                
-                if draft.get('metadata'):
-                    metadata = draft['metadata']
-                    if isinstance(metadata, str):
-                        try:
-                            metadata = json.loads(metadata)
-                        except:
-                            metadata = {}
-                    
-                    if 'revision_of' in metadata:
-                        is_revision = True
-                        revision_info = f" Revision of #{metadata['revision_of']}"
-                        if 'revision_notes' in metadata:
-                            revision_info += f" - {metadata['revision_notes'][:30]}..."
-                
-                expander_title = f"{draft['platform']}: {draft['topic'][:30]}..."
-                if is_revision:
-                    expander_title = f" {expander_title}"
-                
-                with st.expander(expander_title):
-                    # Handle content display
-                    content_to_show = draft.get('content', '')
-                    if isinstance(content_to_show, dict):
-                        content_to_show = content_to_show.get('content', 'No content')
-                    
-                    st.write(content_to_show[:200] + "...")
-                    st.caption(f"Status: {draft['status']} | ID: {draft['id']} | Created: {draft['created_at']}")
-                    
-                    if is_revision:
-                        st.info(revision_info)
-                    
-                    if draft['status'] == 'draft':
-                        col_x, col_y = st.columns(2)
-                        with col_x:
-                            if st.button("Edit", key=f"edit_{draft['id']}"):
-                                st.session_state.current_content_id = draft['id']
-                                st.session_state.selected_tab = "approve"
-                                st.rerun()
-                        with col_y:
-                            if st.button("Submit", key=f"submit_{draft['id']}"):
-                                system["workflow"].submit_for_approval(draft['id'])
-                                st.success("Submitted!")
-                                st.session_state.refresh_needed = True
-                                time.sleep(1)
-                                st.rerun()
+        recent_drafts_panel()
+
+with tab1:
+    render_create_tab()
 
 # ========== TAB 2: REVIEW QUEUE ==========
-with tab2:
+@st.fragment
+def render_review_tab(review_queue):
+    """Review queue tab"""
     st.header(" Content Review Queue")
     st.caption("Content pending review before approval")
     
-    # Get content needing review - FIXED to show 'pending_approval'
-    review_queue = system["db"].get_content_by_status("pending_approval")
-    
     if not review_queue:
         st.info(" No content pending review")
     else:
-        for item in review_queue:
-            with st.container():
-                # Content card
-                col1, col2 = st.columns([4, 1])
+        item = _queue_table(review_queue, key="review_queue_table")
+        
+        # Details and actions only for the selected row
+        if item:
+            col1, col2 = st.columns([4, 1])
+            
+            with col1:
+                st.subheader(f"{item['platform'].upper()}: {item['topic']}")
                 
-                with col1:
-                    st.subheader(f"{item['platform'].upper()}: {item['topic']}")
-                    
-                    # Content preview - FIX content display
-                    content_to_show = item.get('content', '')
-                    if isinstance(content_to_show, dict):
-                        content_to_show = content_to_show.get('content', 'No content')
-                    
-                    with st.expander("View Full Content", expanded=False):
-                        st.write(content_to_show[:300] + "..." if len(content_to_show) > 300 else content_to_show)
-                        
-                        # Handle metadata display
-                        if item.get('metadata'):
-                            if isinstance(item['metadata'], str):
-                                try:
-                                    metadata = json.loads(item['metadata'])
-                                    if 'hashtags' in metadata:
-                                        st.caption(f"**Hashtags:** {', '.join(metadata['hashtags'])}")
-                                except:
-                                    pass
-                            elif isinstance(item['metadata'], dict) and 'hashtags' in item['metadata']:
-                                st.caption(f"**Hashtags:** {', '.join(item['metadata']['hashtags'])}")
+                # Content preview - FIX content display
+                content_to_show = item.get('content', '')
+                if isinstance(content_to_show, dict):
+                    content_to_show = content_to_show.get('content', 'No content')
                 
-                with col2:
-                    st.caption(f"ID: {item['id']}")
-                    st.caption(f"Created: {item['created_at']}")
+                with st.expander("View Full Content", expanded=False):
+                    st.write(content_to_show[:300] + "..." if len(content_to_show) > 300 else content_to_show)
                     
-                    # Review actions
-                    if st.button(" Review", key=f"review_{item['id']}", use_container_width=True):
-                        st.session_state.selected_tab = "approve"
-                        st.session_state.current_content_id = item['id']
-                        st.rerun()
+                    # Handle metadata display
+                    if 'hashtags' in item['metadata']:
+                        st.caption(f"**Hashtags:** {', '.join(item['metadata']['hashtags'])}")
+            
+            with col2:
+                st.caption(f"ID: {item['id']}")
+                st.caption(f"Created: {item['created_at']}")
                 
-                st.divider()
+                # Review actions
+                if st.button(" Review", key=f"review_{item['id']}", use_container_width=True):
+                    st.session_state.selected_tab = "approve"
+                    st.session_state.current_content_id = item['id']
+                    st.rerun()
+        else:
+            st.caption("Select a row to preview it")
+
+with tab2:
+    render_review_tab(pending_approval)
 
 # ========== TAB 3: APPROVAL WORKFLOW ==========
-with tab3:
+@st.fragment
+def render_approval_tab(approval_queue):
+    """Approval workflow tab"""
     st.header(" Approval Workflow")
     st.caption("Hard approval gate - No content publishes without explicit approval")
-    
-    # Get content pending approval
-    approval_queue = system["db"].get_content_by_status("pending_approval")
+    now = datetime.now()
     
     if st.session_state.current_content_id:
         # Show specific content for approval
@@ -463,11 +642,15 @@ with tab3:
             # Display content for approval
             st.subheader(f"Reviewing: {content['platform']} - {content['topic']}")
             
+            if system["workflow"].is_revision_running(content['id']):
+                st.info("AI revision in progress - the new version will appear under Revision History.")
+            
             # SHOW REVISIONS IF ANY
-            revisions = system["db"].get_revisions_of_content(content['id'])
+            revisions = _q_revisions(content['id'])
             if revisions:
                 st.subheader(" Revision History")
-                for rev in revisions:
+                submit_keys = [f"submit_rev_{rev['id']}" for rev in revisions]
+                for rev, submit_key in zip(revisions, submit_keys):
                     with st.expander(f"Revision from {rev['created_at']}"):
                         rev_content = rev.get('content', '')
                         if isinstance(rev_content, dict):
@@ -475,13 +658,7 @@ with tab3:
                         st.write(rev_content[:500] + "..." if len(rev_content) > 500 else rev_content)
                         
                         # Show revision notes
-                        rev_metadata = rev.get('metadata', {})
-                        if isinstance(rev_metadata, str):
-                            try:
-                                rev_metadata = json.loads(rev_metadata)
-                            except:
-                                rev_metadata = {}
-                        
+                        rev_metadata = rev['metadata']
                         if 'revision_notes' in rev_metadata:
                             st.info(f"**Revision Notes:** {rev_metadata['revision_notes']}")
                         if 'reviewer' in rev_metadata:
@@ -491,10 +668,10 @@ with tab3:
                         if rev['status'] == 'draft':
                             col_r1, col_r2 = st.columns(2)
                             with col_r1:
-                                if st.button(f"Submit Revision", key=f"submit_rev_{rev['id']}"):
+                                if st.button(f"Submit Revision", key=submit_key):
                                     system["workflow"].submit_for_approval(rev['id'])
-                                    st.success("Revision submitted!")
-                                    time.sleep(1)
+                                    _invalidate_queries()
+                                    st.toast("Revision submitted!", icon="✅")
                                     st.rerun()
                 st.divider()
             # END REVISIONS
@@ -511,15 +688,10 @@ with tab3:
                 
                 # AI Analysis
                 with st.expander(" AI Analysis", expanded=True):
-                    if content.get('metadata'):
-                        try:
-                            if isinstance(content['metadata'], str):
-                                metadata = json.loads(content['metadata'])
-                            else:
-                                metadata = content['metadata']
-                            st.json(metadata, expanded=False)
-                        except:
-                            st.info("No metadata available")
+                    if content['metadata']:
+                        st.json(content['metadata'], expanded=False)
+                    else:
+                        st.info("No metadata available")
                 
                 # Edit interface
                 with st.expander(" Request Edits", expanded=False):
@@ -533,9 +705,8 @@ with tab3:
                                 st.session_state.get('user', 'admin')
                             )
                             if success:
-                                st.success(" Content sent for AI revision! Check 'Recent Drafts & Revisions' for the new version.")
-                                st.session_state.refresh_needed = True
-                                time.sleep(2)
+                                _invalidate_queries()
+                                st.toast("Content sent for AI revision! Check 'Recent Drafts & Revisions' for the new version.", icon="✅")
                                 st.rerun()
                             else:
                                 st.error(" Revision failed")
@@ -552,17 +723,16 @@ with tab3:
                         approver=approver,
                         comments="Approved via dashboard"
                     )
-                    st.success(" Content Approved!")
+                    st.toast("Content Approved!", icon="✅")
                     
                     # Auto-schedule if in supervised mode
-                    if system["safety"].mode == "supervised_auto":
-                        schedule_time = datetime.now() + timedelta(hours=2)
+                    if system["safety"].mode.value == "supervised_auto":
+                        schedule_time = now + timedelta(hours=2)
                         system["scheduler"].schedule_content(content['id'], schedule_time)
-                        st.info(f" Auto-scheduled for {schedule_time.strftime('%Y-%m-%d %H:%M')}")
+                        st.toast(f"Auto-scheduled for {schedule_time.strftime('%Y-%m-%d %H:%M')}")
+                    _invalidate_queries()
                     
-                    time.sleep(2)
                     st.session_state.current_content_id = None
-                    st.session_state.refresh_needed = True
                     st.rerun()
                 
                 if st.button(" REJECT CONTENT", type="secondary", use_container_width=True):
@@ -574,17 +744,16 @@ with tab3:
                             reason=rejection_reason,
                             reviewer=approver
                         )
-                        st.error(" Content Rejected")
-                        time.sleep(2)
+                        _invalidate_queries()
+                        st.toast("Content Rejected", icon="❌")
                         st.session_state.current_content_id = None
-                        st.session_state.refresh_needed = True
                         st.rerun()
                 
                 # Safety check
-                safety_check = system["safety"].check_content(content_to_show)
+                safety_check = _safety_check(content_to_show)
                 if not safety_check["safe"]:
                     st.warning(" Safety flags detected")
-                    for flag in safety_check["flags"]:
+                    for flag in safety_check["issues"]:
                         st.caption(f"• {flag}")
     
     # Show approval queue
@@ -592,24 +761,99 @@ with tab3:
         st.divider()
         st.subheader("Approval Queue")
         
+        # Drop queued decisions for items that left the queue some other way
+        live_ids = {queued['id'] for queued in approval_queue}
+        for stale_id in [cid for cid in st.session_state.pending_decisions if cid not in live_ids]:
+            del st.session_state.pending_decisions[stale_id]
+        
         if not approval_queue:
             st.info(" No content in approval queue")
         else:
-            for item in approval_queue:
-                col1, col2, col3 = st.columns([3, 1, 1])
-                with col1:
-                    st.write(f"**{item['platform']}:** {item['topic'][:50]}...")
-                    st.caption(f"Submitted: {item['created_at']}")
-                with col2:
-                    if st.button("Review", key=f"quick_review_{item['id']}"):
-                        st.session_state.current_content_id = item['id']
+            decisions = st.session_state.pending_decisions
+            reviewer = st.session_state.get('user', 'admin')
+            
+            # Approve/Reject checkboxes edit the queued decisions, which are
+            # written together on Apply. The key follows the queue's ids so
+            # edits never land on the wrong row once the queue changes.
+            editor_key = f"approval_editor_{hash(tuple(item['id'] for item in approval_queue))}"
+            edited = st.data_editor(
+                [{"ID": item['id'], "Platform": item['platform'], "Topic": item['topic'][:60],
+                  "Created": item['created_at'],
+                  "Approve": decisions.get(item['id'], {}).get('action') == "approved",
+                  "Reject": decisions.get(item['id'], {}).get('action') == "rejected"}
+                 for item in approval_queue],
+                disabled=["ID", "Platform", "Topic", "Created"],
+                hide_index=True,
+                use_container_width=True,
+                key=editor_key
+            )
+            
+            for row in edited:
+                if row["Approve"] == row["Reject"]:
+                    # Neither box, or both: nothing to apply for this row
+                    decisions.pop(row["ID"], None)
+                elif row["Approve"]:
+                    decisions[row["ID"]] = {"content_id": row["ID"], "action": "approved",
+                                            "reviewer": reviewer, "comments": "Approved via dashboard"}
+                else:
+                    decisions[row["ID"]] = {"content_id": row["ID"], "action": "rejected",
+                                            "reviewer": reviewer, "comments": "Rejected from approval queue"}
+            
+            col_q1, col_q2 = st.columns([3, 1])
+            with col_q1:
+                review_id = st.selectbox(
+                    "Open for review",
+                    [item['id'] for item in approval_queue],
+                    format_func=lambda i: f"#{i}",
+                    label_visibility="collapsed"
+                )
+            with col_q2:
+                if st.button("Review", key="quick_review", use_container_width=True):
+                    st.session_state.current_content_id = review_id
+                    _rerun_fragment()
+            
+            if decisions:
+                st.caption("Queued: " + ", ".join(f"#{cid} {d['action']}" for cid, d in decisions.items()))
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    if st.button(f"Apply {len(decisions)} decisions", type="primary"):
+                        applied = system["workflow"].apply_decisions(list(decisions.values()))
+                        
+                        # Auto-schedule if in supervised mode
+                        if system["safety"].mode.value == "supervised_auto":
+                            for d in applied:
+                                if d['action'] == "approved":
+                                    system["scheduler"].schedule_content(d['content_id'], now + timedelta(hours=2))
+                        
+                        skipped = len(decisions) - len(applied)
+                        decisions.clear()
+                        _invalidate_queries()
+                        st.toast(f"Applied {len(applied)} decisions", icon="✅")
+                        if skipped:
+                            st.toast(f"Skipped {skipped} already decided elsewhere", icon="⚠️")
                         st.rerun()
-                with col3:
-                    st.caption(f"ID: {item['id']}")
+                with col_b:
+                    if st.button("Clear queued decisions"):
+                        decisions.clear()
+                        del st.session_state[editor_key]
+                        _rerun_fragment()
+
+with tab3:
+    render_approval_tab(pending_approval)
 
 # ========== TAB 4: SCHEDULING ==========
-with tab4:
+# Fixed option lists for the scheduling rules, shared by every platform row
+RULE_PLATFORMS = ("LinkedIn", "Twitter", "Instagram")
+RULE_TIME_KEYS = tuple(f"times_{platform}" for platform in RULE_PLATFORMS)
+POSTING_TIME_SLOTS = ("8-10 AM", "12-1 PM", "5-7 PM", "8-9 PM")
+DEFAULT_POSTING_TIMES = ("8-10 AM", "5-7 PM")
+
+@st.fragment
+def render_schedule_tab():
+    """Scheduling tab"""
     st.header(" Content Scheduling")
+    # One clock reading per run so the calendar and past-time guard agree
+    now = datetime.now()
     
     col1, col2 = st.columns([2, 1])
     
@@ -617,58 +861,62 @@ with tab4:
         # Calendar view for scheduling
         st.subheader("Schedule Calendar")
         
-        # Get scheduled content
-        scheduled = system["db"].get_content_by_status("scheduled")
-        
         # Simple calendar display
-        today = datetime.now()
-        
+        # Get content scheduled over the next seven days
+        week_start = datetime.combine(now.date(), datetime.min.time())
+        scheduled = _q_scheduled_between(week_start, week_start + timedelta(days=7))
+
+        # Bucket by day in one pass; rows arrive ordered by scheduled_time
+        by_day = defaultdict(list)
+        for c in scheduled:
+            by_day[c['scheduled_time'].date()].append(c)
+
         for i in range(7):
-            day = today + timedelta(days=i)
-            day_content = [c for c in scheduled 
-                          if c.get('scheduled_time') 
-                          and isinstance(c['scheduled_time'], datetime)
-                          and c['scheduled_time'].date() == day.date()]
-            
+            day = now + timedelta(days=i)
+            day_content = by_day.get(day.date(), [])
+
             with st.expander(f"{day.strftime('%A, %b %d')}"):
                 if day_content:
-                    for content in day_content:
-                        st.write(f" {content['scheduled_time'].strftime('%H:%M')} - {content['platform']}")
-                        st.caption(content['topic'][:50])
+                    st.markdown("\n\n".join(
+                        f" {content['scheduled_time'].strftime('%H:%M')} - {content['platform']}  \n"
+                        f":gray[{content['topic'][:50]}]"
+                        for content in day_content
+                    ))
                 else:
                     st.info("No content scheduled")
         
         # Quick schedule interface
         st.subheader("Quick Schedule")
         
-        approved_content = system["db"].get_content_by_status("approved")
+        # Most recent approved content only; the dropdown shouldn't grow without bound
+        approved_content = _q_queues()["approved"]
         
         if approved_content:
-            content_options = {f"{c['id']}: {c['platform']} - {c['topic'][:30]}": c['id'] 
-                              for c in approved_content}
+            approved_by_id = {c['id']: c for c in approved_content}
+            content_id = st.selectbox(
+                "Select content to schedule:",
+                list(approved_by_id),
+                format_func=lambda i: f"{i}: {approved_by_id[i]['platform']} - {approved_by_id[i]['topic'][:30]}"
+            )
             
-            if content_options:
-                selected = st.selectbox("Select content to schedule:", list(content_options.keys()))
-                
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    schedule_date = st.date_input("Date", min_value=datetime.now().date())
-                with col_b:
-                    schedule_time = st.time_input("Time")
+            col_a, col_b = st.columns(2)
+            with col_a:
+                schedule_date = st.date_input("Date", min_value=now.date())
+            with col_b:
+                schedule_time = st.time_input("Time")
+            
+            if st.button(" Schedule Content"):
+                schedule_datetime = datetime.combine(schedule_date, schedule_time)
                 
-                if st.button(" Schedule Content"):
-                    schedule_datetime = datetime.combine(schedule_date, schedule_time)
-                    
-                    if schedule_datetime < datetime.now():
-                        st.error("Cannot schedule in the past")
-                    else:
-                        content_id = content_options[selected]
-                        system["scheduler"].schedule_content(content_id, schedule_datetime)
-                        st.success(f" Scheduled for {schedule_datetime.strftime('%Y-%m-%d %H:%M')}")
-                        time.sleep(1)
-                        st.rerun()
-            else:
-                st.info("No approved content available for scheduling")
+                if schedule_datetime < now:
+                    st.error("Cannot schedule in the past")
+                else:
+                    system["scheduler"].schedule_content(content_id, schedule_datetime)
+                    _invalidate_queries()
+                    st.toast(f"Scheduled for {schedule_datetime.strftime('%Y-%m-%d %H:%M')}", icon="✅")
+                    # The approved list and calendar both live in this tab;
+                    # the sidebar counts catch up on their own timer
+                    _rerun_fragment()
         else:
             st.info("No approved content available for scheduling")
     
@@ -685,14 +933,12 @@ with tab4:
         
         # Optimal times
         st.caption("Optimal Posting Times")
-        platforms = ["LinkedIn", "Twitter", "Instagram"]
-        
-        for platform in platforms:
+        for platform, times_key in zip(RULE_PLATFORMS, RULE_TIME_KEYS):
             st.multiselect(
                 f"{platform} best times",
-                ["8-10 AM", "12-1 PM", "5-7 PM", "8-9 PM"],
-                default=["8-10 AM", "5-7 PM"],
-                key=f"times_{platform}"
+                POSTING_TIME_SLOTS,
+                default=DEFAULT_POSTING_TIMES,
+                key=times_key
             )
         
         # Auto-schedule rules
@@ -702,8 +948,23 @@ with tab4:
             buffer_days = st.slider("Schedule X days after approval", 0, 7, 1)
             avoid_weekends = st.checkbox("Avoid weekends", value=True)
 
+with tab4:
+    render_schedule_tab()
+
 # ========== TAB 5: MONITORING & SAFETY ==========
-with tab5:
+@st.cache_resource
+def _performance_table():
+    """Static demo performance data, built as an Arrow table once per process"""
+    return pa.table({
+        "Platform": ["LinkedIn", "Twitter", "Instagram", "Facebook"],
+        "Posts": [12, 24, 18, 8],
+        "Avg. Engagement": [45, 120, 210, 35],
+        "Approval Rate": [85, 92, 78, 65]
+    })
+
+@st.fragment
+def render_monitor_tab():
+    """Monitoring and safety tab"""
     col1, col2 = st.columns([3, 1])
     
     with col1:
@@ -712,7 +973,10 @@ with tab5:
         # Real-time metrics
         metrics_cols = st.columns(4)
         
-        stats = system["db"].get_system_stats()
+        # Stats and the activity timeline come back from one query, only rerun
+        # when the change token shows the database has moved on
+        snapshot = _q_monitor(10, system["db"].change_token())
+        stats = snapshot["stats"]
         
         with metrics_cols[0]:
             st.metric("AI Generations", stats["generated"], delta="+12 today")
@@ -726,23 +990,13 @@ with tab5:
         # Activity timeline
         st.subheader(" Activity Timeline")
         
-        activities = system["db"].get_recent_activities(limit=10)
-        
-        for activity in activities:
-            timestamp = activity['timestamp'][11:16] if activity['timestamp'] else "--:--"
-            st.caption(f"**{timestamp}** - {activity['action']}: {activity['details'][:50]}...")
+        # One element for the whole timeline instead of one per row
+        st.caption(snapshot["timeline"])
         
         # Content performance (simulated)
         st.subheader(" Content Performance")
         
-        performance_data = {
-            "Platform": ["LinkedIn", "Twitter", "Instagram", "Facebook"],
-            "Posts": [12, 24, 18, 8],
-            "Avg. Engagement": [45, 120, 210, 35],
-            "Approval Rate": [85, 92, 78, 65]
-        }
-        
-        st.dataframe(performance_data, use_container_width=True)
+        st.dataframe(_performance_table(), use_container_width=True)
     
     with col2:
         st.header(" Safety Dashboard")
@@ -761,7 +1015,7 @@ with tab5:
         if st.button(" Enable Crisis Mode", type="secondary"):
             system["safety"].activate_crisis_mode("manual_activation")
             st.session_state.emergency_mode = True
-            st.error(" CRISIS MODE ACTIVATED - All posting halted")
+            st.toast("CRISIS MODE ACTIVATED - All posting halted", icon="🚨")
             st.rerun()
         
         if st.button(" Manual Review All", type="secondary"):
@@ -774,8 +1028,10 @@ with tab5:
         
         audit_log = system["safety"].get_audit_log(limit=5)
         
-        for log in audit_log:
-            st.caption(f"{log['timestamp']}: {log['event']}")
+        st.caption("\n\n".join(f"{log['timestamp']}: {log['event']}" for log in audit_log))
+
+with tab5:
+    render_monitor_tab()
 
 # ========== FOOTER ==========
 st.divider()
@@ -4,363 +4,970 @@ Production database layer with SQLite/PostgreSQL support
 
 import sqlite3
 import json
+import queue
+import threading
+import weakref
+import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output modulo whitespace
+    orjson = None
+
+def json_dumpb(obj) -> bytes:
+    """Serialize metadata to UTF-8 JSON bytes, with orjson when it's installed
+    
+    Metadata is stored as these bytes (a BLOB), so neither side of the
+    round trip re-encodes text.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def json_loads(data):
+    """Parse a JSON string or bytes, with orjson when it's installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Applied to every connection. busy_timeout makes a locked database wait
+# for the other process instead of failing straight away.
+_PRAGMAS = (
+    "busy_timeout=5000",
+    "temp_store=MEMORY",
+    "cache_size=-20000",
+)
+
+# The writer also sets the journal mode; WAL lets readers run alongside it
+_WRITER_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    *_PRAGMAS,
+)
+
+# Statements on the workflow's write paths. Sharing one string means each
+# connection's statement cache compiles them once, not once per call site.
+_SQL_SET_STATUS = '''
+    UPDATE content SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+'''
+# Only moves rows still waiting for approval; a decision queued against a
+# stale queue must not override one another reviewer already made
+_SQL_DECIDE_PENDING = '''
+    UPDATE content SET status = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND status = 'pending_approval'
+'''
+_SQL_SET_METADATA = '''
+    UPDATE content SET metadata = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+'''
+# A pending post is dropped when its content is rescheduled or rejected
+_SQL_SUPERSEDE_POSTS = '''
+    UPDATE scheduled_posts SET status = 'superseded'
+    WHERE content_id = ? AND status = 'pending'
+'''
+_SQL_INSERT_APPROVAL = '''
+    INSERT INTO approvals (content_id, approver, action, comments, timestamp)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+_SQL_INSERT_CONTENT = '''
+    INSERT INTO content (platform, topic, content, metadata, status) VALUES (?, ?, ?, ?, ?)
+'''
+_SQL_LOG_ACTIVITY = '''
+    INSERT INTO activity_log (action, details, content_id) VALUES (?, ?, ?)
+'''
+# Structured entry: the display text is built from the template on read
+_SQL_LOG_EVENT = '''
+    INSERT INTO activity_log (action, content_id, actor, note) VALUES (?, ?, ?, ?)
+'''
+
+# Statements record_workflow_event accepts, by name
+_WORKFLOW_STATEMENTS = {
+    "set_status": _SQL_SET_STATUS,
+    "set_metadata": _SQL_SET_METADATA,
+    "insert_approval": _SQL_INSERT_APPROVAL,
+    "supersede_posts": _SQL_SUPERSEDE_POSTS,
+    "log_activity": _SQL_LOG_ACTIVITY,
+    "log_event": _SQL_LOG_EVENT,
+}
+
+# Display text for structured activity entries, by action
+_ACTIVITY_TEMPLATES = {
+    "submitted_for_approval": "Content {content_id} submitted for approval",
+    "approved": "Content {content_id} approved by {actor}",
+    "rejected": "Content {content_id} rejected: {note}",
+    "content_approved": "Approved by {actor}",
+    "content_rejected": "Rejected: {note:.50}",
+    "revision_requested": "Revision: {note:.50}",
+    "content_regenerated": "Regenerated from content {note} based on revision notes",
+    "revision_created": "New version {note} created from revision of {content_id}",
+}
+
+# Compiled statements kept per connection; comfortably above what we issue
+_CACHED_STATEMENTS = 256
+
+# Ids bound per IN list; older SQLite builds cap a statement at 999 variables
+_MAX_IN_PARAMS = 500
+
+# Most deferred writes committed together by the background writer
+DEFERRED_BATCH = 64
+
+# Seconds a cached get_system_stats result may be served without a local write
+STATS_TTL = 5.0
+
+def _chunked(items: List, size: int = _MAX_IN_PARAMS):
+    """Yield consecutive slices of items holding at most size elements"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _row_to_content(row) -> Dict:
+    """Convert a content row to a dict with metadata decoded once"""
+    content = dict(row)
+    try:
+        content['metadata'] = json_loads(content['metadata']) if content.get('metadata') else {}
+    except ValueError:
+        content['metadata'] = {}
+    return content
+
+def _metadata_bytes(value) -> bytes:
+    """Stored metadata as bytes; rows written before the BLOB switch hold TEXT"""
+    if not value:
+        return b"null"
+    return value if isinstance(value, bytes) else value.encode()
+
+def _rows_to_content(rows) -> List[Dict]:
+    """Convert content rows to dicts, decoding all metadata in one parse
+    
+    The metadata strings are joined into a single JSON array so the parser
+    runs once for the whole list. If that fails, or a malformed value
+    throws off the element count, each row is decoded on its own.
+    """
+    contents = [dict(row) for row in rows]
+    try:
+        decoded = json_loads(b"[" + b",".join(_metadata_bytes(c['metadata']) for c in contents) + b"]")
+    except ValueError:
+        decoded = None
+    
+    if decoded is None or len(decoded) != len(contents):
+        return [_row_to_content(row) for row in rows]
+    
+    for content, metadata in zip(contents, decoded):
+        content['metadata'] = metadata or {}
+    return contents
+
+# Every content column, for single-item reads
+_CONTENT_COLUMNS = ("id, topic, platform, content, metadata, status, created_at, "
+                    "updated_at, scheduled_time, published_time, media_paths")
+
+# What list views use; bookkeeping columns stay in the table
+_LIST_COLUMNS = ("id, topic, platform, {content} AS content, metadata, status, "
+                 "created_at, scheduled_time")
+_LIST_SELECT = _LIST_COLUMNS.format(content="content")
+
+def _content_columns(preview_len: Optional[int] = None):
+    """Select list for content lists, truncating the body in SQL for previews"""
+    if preview_len:
+        return _LIST_COLUMNS.format(content="substr(content, 1, ?)"), (preview_len,)
+    return _LIST_SELECT, ()
+
+def _build_stats(status_counts, generated: int) -> Dict:
+    """Assemble the stats dict from (status, count) pairs and the generation count"""
+    stats = {
+        "total": 0,
+        "draft": 0,
+        "pending_review": 0,
+        "pending_approval": 0,
+        "approved": 0,
+        "scheduled": 0,
+        "published": 0,
+        "rejected": 0
+    }
+    
+    for status, count in status_counts:
+        stats[status] = count
+        stats["total"] += count
+    
+    # Calculate approval rate from the counts above
+    decided = stats["approved"] + stats["rejected"]
+    stats["approval_rate"] = round((stats["approved"] / decided * 100) if decided > 0 else 0, 1)
+    stats["generated"] = generated
+    return stats
+
+def _activity_details(action: str, details: Optional[str], content_id, actor: Optional[str],
+                      note: Optional[str]) -> str:
+    """Display text for an activity row; free-text details win over the template"""
+    if details is not None:
+        return details
+    template = _ACTIVITY_TEMPLATES.get(action)
+    if template is None:
+        return note or ""
+    return template.format(content_id=content_id, actor=actor or "", note=note or "")
+
+def _drain_deferred(deferred: queue.SimpleQueue, db_ref):
+    """Background loop committing queued writes in batches
+    
+    The database is only held weakly between batches, so the thread
+    doesn't keep an otherwise unused ContentDatabase alive.
+    """
+    while True:
+        batch = [deferred.get()]
+        while len(batch) < DEFERRED_BATCH:
+            try:
+                batch.append(deferred.get_nowait())
+            except queue.Empty:
+                break
+        
+        stop = None in batch
+        calls = [call for call in batch if call is not None]
+        db = db_ref() if calls else None
+        if db is not None:
+            db._commit_deferred(calls)
+        batch = calls = db = None
+        if stop:
+            break
+
+def _close_database(deferred: queue.SimpleQueue, worker: threading.Thread, write_lock,
+                    writer: sqlite3.Connection, state_lock, conns: List[sqlite3.Connection]):
+    """Finish deferred writes, then close every connection the database has opened"""
+    if worker.is_alive():
+        deferred.put(None)
+        worker.join(timeout=5)
+    
+    # Let SQLite refresh statistics the session's queries would benefit from
+    with write_lock:
+        try:
+            writer.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass  # already closed
+    
+    with state_lock:
+        closing, conns[:] = list(conns), []
+    for conn in closing:
+        conn.close()
 
 class ContentDatabase:
     def __init__(self, db_path: str = "content.db"):
         self.db_path = db_path
+        
+        # Idle read-only connections, reused by whichever thread needs one
+        # next. Streamlit runs each rerun on a fresh thread, so connections
+        # are pooled rather than left to die with their thread.
+        self._pool = queue.LifoQueue()
+        self._local = threading.local()
+        self._all_conns = []
+        self._state_lock = threading.Lock()
+        self._writes = 0
+        
+        # Last get_system_stats result, the write count it was taken at and
+        # when. Any write through this object or STATS_TTL passing drops it.
+        self._stats_cache = None
+        self._stats_cache_token = -1
+        self._stats_cache_ts = 0.0
+        
+        # All writes go through one connection, one thread at a time. Under
+        # WAL the pooled readers keep reading the last commit meanwhile.
+        self._write_lock = threading.RLock()
+        self._writer = self._connect(f"file:{quote(db_path)}?mode=rwc", _WRITER_PRAGMAS)
+        self._writer.isolation_level = None
+        
         self._init_tables()
+        
+        # Writes nobody waits on (activity entries, notifications) are queued
+        # and committed in batches by one background thread
+        self._deferred = queue.SimpleQueue()
+        self._deferred_worker = threading.Thread(target=_drain_deferred,
+                                                 args=(self._deferred, weakref.ref(self)),
+                                                 name="db-deferred-writes", daemon=True)
+        self._deferred_worker.start()
+        
+        # Runs close() at exit or when this object is collected, whichever
+        # is first, without the exit hook keeping the object alive
+        self._finalizer = weakref.finalize(self, _close_database, self._deferred, self._deferred_worker,
+                                           self._write_lock, self._writer, self._state_lock,
+                                           self._all_conns)
+    
+    def _connect(self, uri: str, pragmas=_PRAGMAS) -> sqlite3.Connection:
+        """Open a connection with pragmas applied"""
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=_CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        for pragma in pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        with self._state_lock:
+            self._all_conns.append(conn)
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Borrow a read-only connection for the current thread
+        
+        Nested use on the same thread gets the same connection, and inside
+        _transaction that is the writer, so a block reads its own writes.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect(f"file:{quote(self.db_path)}?mode=ro")
+        
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block on the writer as one IMMEDIATE transaction
+        
+        Taking SQLite's write lock up front means the block never has to
+        upgrade a read lock halfway through, which is where SQLITE_BUSY
+        comes from under WAL. A nested block joins the outer transaction;
+        a failing block rolls the whole thing back.
+        """
+        with self._write_lock:
+            conn = self._writer
+            if conn.in_transaction:
+                yield conn
+                return
+            
+            outer = getattr(self._local, "conn", None)
+            self._local.conn = conn
+            changes = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.conn = outer
+                if conn.total_changes != changes:
+                    with self._state_lock:
+                        self._writes += 1
+    
+    def transaction(self):
+        """Group several of this object's writes into one transaction
+        
+        Write methods called inside the block join it instead of committing
+        on their own, so everything lands with a single commit:
+        
+            with db.transaction():
+                db.update_status(content_id, "approved")
+                db.log_activity("approved", "...", content_id)
+        """
+        return self._transaction()
+    
+    def defer_write(self, method, *args, **kwargs):
+        """Run a write method later on the background writer and return at once
+        
+        Queued calls are committed together, up to DEFERRED_BATCH per
+        transaction; a call that raises is rolled back and logged on its
+        own. Use this only for writes the caller doesn't read back.
+        """
+        self._deferred.put((method, args, kwargs))
+    
+    def _commit_deferred(self, calls):
+        """Commit one batch of queued writes for the background writer"""
+        try:
+            with self._transaction() as conn:
+                for method, args, kwargs in calls:
+                    # Each call gets a savepoint, so a failing write is
+                    # dropped alone and the rest of the batch commits
+                    conn.execute("SAVEPOINT deferred_write")
+                    try:
+                        method(*args, **kwargs)
+                    except Exception:
+                        conn.execute("ROLLBACK TO deferred_write")
+                        logger.exception("Deferred write %s dropped",
+                                         getattr(method, "__name__", method))
+                    conn.execute("RELEASE deferred_write")
+        except Exception:
+            logger.exception("Deferred write batch failed (%d dropped)", len(calls))
+    
+    def close(self):
+        """Finish deferred writes, then close every connection this database has opened"""
+        self._finalizer()
+    
+    def change_token(self) -> int:
+        """Cheap value that changes whenever data is written through this object
+        
+        Counts blocks that wrote rows, from any thread, without touching
+        the database at all.
+        """
+        return self._writes
     
     def _init_tables(self):
         """Initialize database tables"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Content table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS content (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                platform TEXT NOT NULL,
-                content TEXT NOT NULL,
-                metadata TEXT,
-                status TEXT DEFAULT 'draft',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                scheduled_time TIMESTAMP,
-                published_time TIMESTAMP,
-                media_paths TEXT
-            )
-        ''')
-        
-        # Approvals table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS approvals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_id INTEGER,
-                approver TEXT,
-                action TEXT,
-                comments TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (content_id) REFERENCES content (id)
-            )
-        ''')
-        
-        # Activity log
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activity_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                action TEXT,
-                details TEXT,
-                content_id INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Content table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS content (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata BLOB,
+                    status TEXT DEFAULT 'draft',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    scheduled_time TIMESTAMP,
+                    published_time TIMESTAMP,
+                    media_paths TEXT
+                )
+            ''')
+            
+            # Approvals table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS approvals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_id INTEGER,
+                    approver TEXT,
+                    action TEXT,
+                    comments TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (content_id) REFERENCES content (id)
+                )
+            ''')
+            
+            # Activity log
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS activity_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    action TEXT,
+                    details TEXT,
+                    content_id INTEGER,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    actor TEXT,
+                    note TEXT
+                )
+            ''')
+            # Logs created before actor/note existed get the columns added
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(activity_log)")}
+            for column in ("actor", "note"):
+                if column not in columns:
+                    cursor.execute(f"ALTER TABLE activity_log ADD COLUMN {column} TEXT")
+            
+            # Scheduled posts, one row per scheduling decision
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scheduled_posts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_id INTEGER,
+                    scheduled_time TIMESTAMP,
+                    status TEXT DEFAULT 'pending',
+                    posted_at TIMESTAMP,
+                    FOREIGN KEY (content_id) REFERENCES content (id)
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_status_time ON content (status, scheduled_time)
+            ''')
+            # Status queues are read newest first; this serves them without a sort
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_status_created ON content (status, created_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sp_pending ON scheduled_posts (scheduled_time)
+                WHERE status = 'pending'
+            ''')
+            # Recent-content and activity lists sort on these; action backs the generation count
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_content_created ON content (created_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_activity_ts ON activity_log (timestamp)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_activity_action ON activity_log (action)
+            ''')
+            # Per-item history lookups
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_activity_content ON activity_log (content_id)
+            ''')
+            
+            # Give the planner statistics the first time the schema is set up
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                cursor.execute("ANALYZE")
     
     def create_content(self, platform: str, topic: str, content: str, 
                       metadata: Dict, status: str = "draft") -> int:
         """Create new content entry"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO content (platform, topic, content, metadata, status)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (platform, topic, content, json.dumps(metadata), status))
-        
-        content_id = cursor.lastrowid
-        
-        # Log activity
-        cursor.execute('''
-            INSERT INTO activity_log (action, details, content_id)
-            VALUES (?, ?, ?)
-        ''', ('content_created', f'Created {platform} content: {topic[:50]}', content_id))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_INSERT_CONTENT, (platform, topic, content, json_dumpb(metadata), status))
+            
+            content_id = cursor.lastrowid
+            
+            # Log activity
+            cursor.execute(_SQL_LOG_ACTIVITY, ('content_created', f'Created {platform} content: {topic[:50]}',
+                                               content_id))
         
         return content_id
     
     def get_content(self, content_id: int) -> Optional[Dict]:
         """Get content by ID"""
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM content WHERE id = ?
-        ''', (content_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            content = dict(row)
-            if content.get('metadata'):
-                try:
-                    content['metadata'] = json.loads(content['metadata'])
-                except:
-                    content['metadata'] = {}
-            return content
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {_CONTENT_COLUMNS} FROM content WHERE id = ?
+            ''', (content_id,))
+            
+            row = cursor.fetchone()
         
-        return None
+        return _row_to_content(row) if row else None
     
-    def get_content_by_status(self, status: str) -> List[Dict]:
-        """Get content by status"""
+    def content_exists(self, content_id: int) -> bool:
+        """Whether a content item exists, without reading any of its columns"""
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM content WHERE status = ? ORDER BY created_at DESC
-        ''', (status,))
+        with self._connection() as conn:
+            row = conn.execute("SELECT 1 FROM content WHERE id = ? LIMIT 1", (content_id,)).fetchone()
         
-        rows = cursor.fetchall()
-        conn.close()
+        return row is not None
+    
+    def get_status(self, content_id: int) -> Optional[str]:
+        """Get just the status of a content item, or None if it doesn't exist"""
         
-        result = []
-        for row in rows:
-            content = dict(row)
-            if content.get('metadata'):
-                try:
-                    content['metadata'] = json.loads(content['metadata'])
-                except:
-                    content['metadata'] = {}
-            result.append(content)
+        with self._connection() as conn:
+            row = conn.execute("SELECT status FROM content WHERE id = ?", (content_id,)).fetchone()
         
-        return result
+        return row[0] if row else None
+    
+    def get_content_by_status(self, status: str, limit: Optional[int] = None,
+                              preview_len: Optional[int] = None) -> List[Dict]:
+        """Get content by status, newest first, optionally capped at limit rows
+        
+        With preview_len, only the first preview_len characters of each body
+        are read.
+        """
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # LIMIT -1 means no limit in SQLite
+            columns, params = _content_columns(preview_len)
+            cursor.execute(f'''
+                SELECT {columns} FROM content WHERE status = ? ORDER BY created_at DESC LIMIT ?
+            ''', (*params, status, -1 if limit is None else limit))
+            
+            rows = cursor.fetchall()
+        
+        return _rows_to_content(rows)
+    
+    def get_content_by_statuses(self, limits: Dict[str, Optional[int]],
+                                preview_len: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Get several status queues with one query, bucketed by status
+        
+        limits maps each status to the number of newest rows to return, or
+        None for all of them. Buckets are ordered newest first.
+        """
+        
+        buckets = {status: [] for status in limits}
+        if not limits:
+            return buckets
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # ROW_NUMBER caps each status separately within the single scan
+            columns, params = _content_columns(preview_len)
+            wanted = ", ".join("(?, ?)" for _ in limits)
+            cursor.execute(f'''
+                WITH wanted (status, lim) AS (VALUES {wanted}),
+                ranked AS (
+                    SELECT {columns}, ROW_NUMBER() OVER (
+                        PARTITION BY status ORDER BY created_at DESC, id DESC
+                    ) AS rn
+                    FROM content WHERE status IN (SELECT status FROM wanted)
+                )
+                SELECT ranked.* FROM ranked JOIN wanted USING (status)
+                WHERE wanted.lim IS NULL OR ranked.rn <= wanted.lim
+                ORDER BY ranked.rn
+            ''', (*[v for item in limits.items() for v in item], *params))
+            
+            rows = cursor.fetchall()
+        
+        for content in _rows_to_content(rows):
+            del content['rn']
+            buckets[content['status']].append(content)
+        
+        return buckets
     
     def update_status(self, content_id: int, status: str):
         """Update content status"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE content 
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (status, content_id))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_SET_STATUS, (status, content_id))
     
-    def get_system_stats(self) -> Dict:
-        """Get system statistics"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get counts by status
-        cursor.execute('''
-            SELECT status, COUNT(*) as count FROM content GROUP BY status
-        ''')
-        
-        status_counts = cursor.fetchall()
-        
-        # Calculate totals
-        stats = {
-            "total": 0,
-            "draft": 0,
-            "pending_review": 0,
-            "pending_approval": 0,
-            "approved": 0,
-            "scheduled": 0,
-            "published": 0,
-            "rejected": 0
-        }
-        
-        for status, count in status_counts:
-            stats[status] = count
-            stats["total"] += count
-        
-        # Calculate approval rate
-        cursor.execute('''
-            SELECT COUNT(*) as total, 
-                   SUM(CASE WHEN status = 'approved' THEN 1 ELSE 0 END) as approved
-            FROM content 
-            WHERE status IN ('approved', 'rejected')
-        ''')
-        
-        total, approved = cursor.fetchone()
-        stats["approval_rate"] = round((approved / total * 100) if total > 0 else 0, 1)
-        
-        # Get AI generation count
-        cursor.execute('''
-            SELECT COUNT(*) as generated FROM activity_log 
-            WHERE action = 'content_created'
-        ''')
-        
-        stats["generated"] = cursor.fetchone()[0]
-        
-        conn.close()
-        return stats
+    def update_status_many(self, content_ids: List[int], status: str):
+        """Update status for several content items in one transaction"""
+        
+        if not content_ids:
+            return
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            for chunk in _chunked(list(content_ids)):
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f'''
+                    UPDATE content 
+                    SET status = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({placeholders})
+                ''', (status, *chunk))
     
-    def get_recent_content(self, limit: int = 10) -> List[Dict]:
-        """Get recent content"""
-        
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM content 
-            ORDER BY created_at DESC 
-            LIMIT ?
-        ''', (limit,))
+    def update_metadata(self, content_id: int, metadata: Dict):
+        """Replace a content item's metadata"""
         
-        rows = cursor.fetchall()
-        conn.close()
-        
-        result = []
-        for row in rows:
-            content = dict(row)
-            if content.get('metadata'):
-                try:
-                    content['metadata'] = json.loads(content['metadata'])
-                except:
-                    content['metadata'] = {}
-            result.append(content)
+        with self._transaction() as conn:
+            conn.execute(_SQL_SET_METADATA, (json_dumpb(metadata), content_id))
+    
+    def schedule_content(self, content_id: int, scheduled_time: datetime):
+        """Mark content as scheduled and queue it for posting at the given time"""
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE content 
+                SET status = 'scheduled', scheduled_time = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (scheduled_time.isoformat(sep=' '), content_id))
+            
+            # A reschedule replaces any post still waiting for this content
+            cursor.execute(_SQL_SUPERSEDE_POSTS, (content_id,))
+            
+            cursor.execute('''
+                INSERT INTO scheduled_posts (content_id, scheduled_time, status)
+                VALUES (?, ?, 'pending')
+            ''', (content_id, scheduled_time.isoformat(sep=' ')))
+    
+    def claim_due_posts(self, now: datetime) -> List[Dict]:
+        """Mark pending posts due by now as posted and return them
+        
+        Runs as one IMMEDIATE transaction so concurrent workers never claim
+        the same post twice. Only posts whose content is still scheduled are
+        claimed, so content rejected or unscheduled since is never published.
+        """
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            now_str = now.isoformat(sep=' ')
+            cursor.execute('''
+                SELECT sp.id, sp.content_id, sp.scheduled_time
+                FROM scheduled_posts sp JOIN content c ON c.id = sp.content_id
+                WHERE sp.status = 'pending' AND sp.scheduled_time <= ? AND c.status = 'scheduled'
+                ORDER BY sp.scheduled_time
+            ''', (now_str,))
+            
+            due = [dict(row) for row in cursor.fetchall()]
+            
+            for chunk in _chunked(due):
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f'''
+                    UPDATE scheduled_posts SET status = 'posted', posted_at = ?
+                    WHERE id IN ({placeholders})
+                ''', (now_str, *(post['id'] for post in chunk)))
+        
+        for post in due:
+            post['status'] = 'posted'
+            post['posted_at'] = now
+        
+        return due
+    
+    def get_scheduled_posts(self) -> List[Dict]:
+        """Get all scheduled posts, earliest first"""
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT content_id, scheduled_time, status, posted_at FROM scheduled_posts 
+                WHERE status != 'superseded'
+                ORDER BY scheduled_time
+            ''')
+            
+            rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_scheduled_between(self, start: datetime, end: datetime) -> List[Dict]:
+        """Get content scheduled in [start, end), earliest first"""
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {_LIST_SELECT} FROM content 
+                WHERE status = 'scheduled' AND scheduled_time >= ? AND scheduled_time < ?
+                ORDER BY scheduled_time
+            ''', (start.isoformat(sep=' '), end.isoformat(sep=' ')))
+            
+            rows = cursor.fetchall()
+        
+        result = _rows_to_content(rows)
+        for content in result:
+            content['scheduled_time'] = datetime.fromisoformat(content['scheduled_time'])
         
         return result
     
-    def log_activity(self, action: str, details: str, content_id: Optional[int] = None):
-        """Log system activity"""
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO activity_log (action, details, content_id)
-            VALUES (?, ?, ?)
-        ''', (action, details, content_id))
-        
-        conn.commit()
-        conn.close()
+    def get_system_stats(self) -> Dict:
+        """Get system statistics in one round trip
+        
+        Status counts and the generation count come from the same tagged
+        UNION ALL query as the monitor snapshot, with no activity rows.
+        Results are reused until this object writes or STATS_TTL seconds
+        pass; the TTL bounds staleness from writers in other processes.
+        """
+        now = time.monotonic()
+        with self._state_lock:
+            if (self._stats_cache is not None
+                    and self._stats_cache_token == self._writes
+                    and now - self._stats_cache_ts < STATS_TTL):
+                return dict(self._stats_cache)
+            token = self._writes
+        
+        stats = self.get_monitor_snapshot(activity_limit=0)["stats"]
+        
+        with self._state_lock:
+            self._stats_cache = stats
+            self._stats_cache_token = token
+            self._stats_cache_ts = now
+        return dict(stats)
+    
+    def get_monitor_snapshot(self, activity_limit: int = 10) -> Dict:
+        """Get system stats and recent activities in one round trip
+        
+        Rows are tagged so status counts, the generation count and the
+        activity rows can share one UNION ALL result.
+        """
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT 'count' AS tag, status AS a, COUNT(*) AS b, NULL AS c, NULL AS d, NULL AS e,
+                       NULL AS f, NULL AS g
+                FROM content GROUP BY status
+                UNION ALL
+                SELECT 'generated', NULL, COUNT(*), NULL, NULL, NULL, NULL, NULL
+                FROM activity_log WHERE action = 'content_created'
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'activity', action, id, details, content_id, timestamp, actor, note
+                    FROM activity_log ORDER BY timestamp DESC LIMIT ?
+                )
+            ''', (activity_limit,))
+            
+            rows = cursor.fetchall()
+        
+        status_counts = []
+        generated = 0
+        activities = []
+        for tag, a, b, c, d, e, f, g in rows:
+            if tag == 'count':
+                status_counts.append((a, b))
+            elif tag == 'generated':
+                generated = b
+            else:
+                activities.append({"id": b, "action": a, "details": _activity_details(a, c, d, f, g),
+                                   "content_id": d, "timestamp": e, "actor": f, "note": g})
+        
+        # A compound SELECT doesn't promise to keep the subquery's order
+        activities.sort(key=lambda act: (act['timestamp'] or '', act['id']), reverse=True)
+        
+        return {"stats": _build_stats(status_counts, generated), "activities": activities}
+
+    def get_recent_content(self, limit: int = 10, preview_len: Optional[int] = None) -> List[Dict]:
+        """Get recent content, optionally truncating bodies to preview_len characters"""
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            columns, params = _content_columns(preview_len)
+            cursor.execute(f'''
+                SELECT {columns} FROM content 
+                ORDER BY created_at DESC 
+                LIMIT ?
+            ''', (*params, limit))
+            
+            rows = cursor.fetchall()
+        
+        return _rows_to_content(rows)
+    
+    def log_activity(self, action: str, details: Optional[str] = None, content_id: Optional[int] = None,
+                     actor: Optional[str] = None, note: Optional[str] = None):
+        """Log system activity
+        
+        Pass actor/note for actions with an entry in _ACTIVITY_TEMPLATES;
+        the display text is then built when the log is read. details is
+        free text for everything else.
+        """
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            if details is None:
+                cursor.execute(_SQL_LOG_EVENT, (action, content_id, actor, note))
+            else:
+                cursor.execute(_SQL_LOG_ACTIVITY, (action, details, content_id))
     
     def get_recent_activities(self, limit: int = 10) -> List[Dict]:
         """Get recent activities"""
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM activity_log 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in rows]
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, action, details, content_id, timestamp, actor, note FROM activity_log 
+                ORDER BY timestamp DESC 
+                LIMIT ?
+            ''', (limit,))
+            
+            rows = cursor.fetchall()
+        activities = []
+        for row in rows:
+            activity = dict(row)
+            activity['details'] = _activity_details(activity['action'], activity['details'],
+                                                    activity['content_id'], activity['actor'], activity['note'])
+            activities.append(activity)
+        return activities
     
     def record_approval(self, approval_record: dict):
         """Record approval in database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO approvals (content_id, approver, action, comments, timestamp)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            approval_record.get('content_id'),
-            approval_record.get('approver'),
-            'approved',
-            approval_record.get('comments', '')
-        ))
-        
-        # Also update content status
-        cursor.execute('''
-            UPDATE content 
-            SET status = 'approved', updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (approval_record.get('content_id'),))
-        
-        # Log activity
-        cursor.execute('''
-            INSERT INTO activity_log (action, details, content_id)
-            VALUES (?, ?, ?)
-        ''', ('content_approved', f'Approved by {approval_record.get("approver")}', 
-              approval_record.get('content_id')))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_INSERT_APPROVAL, (
+                approval_record.get('content_id'),
+                approval_record.get('approver'),
+                'approved',
+                approval_record.get('comments', '')
+            ))
+            
+            # Also update content status
+            cursor.execute(_SQL_SET_STATUS, ('approved', approval_record.get('content_id')))
+            
+            # Log activity
+            cursor.execute(_SQL_LOG_EVENT, ('content_approved', approval_record.get('content_id'),
+                                            approval_record.get('approver'), None))
     
     def record_rejection(self, rejection_record: dict):
         """Record rejection in database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO approvals (content_id, approver, action, comments, timestamp)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            rejection_record.get('content_id'),
-            rejection_record.get('reviewer'),
-            'rejected',
-            rejection_record.get('reason', '')
-        ))
-        
-        # Update content status
-        cursor.execute('''
-            UPDATE content 
-            SET status = 'rejected', updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (rejection_record.get('content_id'),))
-        
-        # Log activity
-        cursor.execute('''
-            INSERT INTO activity_log (action, details, content_id)
-            VALUES (?, ?, ?)
-        ''', ('content_rejected', f'Rejected: {rejection_record.get("reason", "")[:50]}', 
-              rejection_record.get('content_id')))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_INSERT_APPROVAL, (
+                rejection_record.get('content_id'),
+                rejection_record.get('reviewer'),
+                'rejected',
+                rejection_record.get('reason', '')
+            ))
+            
+            # Update content status; a rejected item must not be published
+            cursor.execute(_SQL_SET_STATUS, ('rejected', rejection_record.get('content_id')))
+            cursor.execute(_SQL_SUPERSEDE_POSTS, (rejection_record.get('content_id'),))
+            
+            # Log activity
+            cursor.execute(_SQL_LOG_EVENT, ('content_rejected', rejection_record.get('content_id'),
+                                            rejection_record.get('reviewer'), rejection_record.get('reason', '')))
+    
+    def record_decisions(self, decisions: List[Dict]) -> List:
+        """Record a batch of approve/reject decisions in one transaction
+        
+        Each decision has content_id, action ('approved' or 'rejected'),
+        reviewer and comments. All rows land with a single commit. Items no
+        longer pending approval are left alone; their ids are returned.
+        """
+        
+        if not decisions:
+            return []
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            skipped = []
+            applied = []
+            for d in decisions:
+                cursor.execute(_SQL_DECIDE_PENDING, (d['action'], d['content_id']))
+                (applied if cursor.rowcount else skipped).append(d)
+            decisions = applied
+            
+            cursor.executemany(_SQL_INSERT_APPROVAL,
+                               [(d['content_id'], d['reviewer'], d['action'], d.get('comments', ''))
+                                for d in decisions])
+            
+            # Same activity entries record_approval/record_rejection write
+            cursor.executemany(_SQL_LOG_EVENT,
+                               [(f"content_{d['action']}", d['content_id'], d['reviewer'],
+                                 d.get('comments', '') if d['action'] == 'rejected' else None)
+                                for d in decisions])
+        
+        return [d['content_id'] for d in skipped]
+    
+    def record_workflow_event(self, events: List[Tuple[str, tuple]]):
+        """Write the rows for one workflow action in a single transaction
+        
+        events is a list of (statement, params) pairs where statement is a
+        key of _WORKFLOW_STATEMENTS, e.g. ("set_status", ("approved", 7)).
+        Rows for the same statement go through one executemany, in the
+        order the statement first appears.
+        """
+        
+        grouped = {}
+        for statement, params in events:
+            grouped.setdefault(statement, []).append(params)
+        
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            for statement, rows in grouped.items():
+                cursor.executemany(_WORKFLOW_STATEMENTS[statement], rows)
     
     def record_revision_request(self, revision_record: dict):
         """Record revision request in database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO approvals (content_id, approver, action, comments, timestamp)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (
-            revision_record.get('content_id'),
-            revision_record.get('reviewer'),
-            'revision_requested',
-            revision_record.get('notes', '')
-        ))
-        
-        # Update content status
-        cursor.execute('''
-            UPDATE content 
-            SET status = 'needs_revision', updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (revision_record.get('content_id'),))
-        
-        # Log activity
-        cursor.execute('''
-            INSERT INTO activity_log (action, details, content_id)
-            VALUES (?, ?, ?)
-        ''', ('revision_requested', f'Revision: {revision_record.get("notes", "")[:50]}', 
-              revision_record.get('content_id')))
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(_SQL_INSERT_APPROVAL, (
+                revision_record.get('content_id'),
+                revision_record.get('reviewer'),
+                'revision_requested',
+                revision_record.get('notes', '')
+            ))
+            
+            # Update content status
+            cursor.execute(_SQL_SET_STATUS, ('needs_revision', revision_record.get('content_id')))
+            
+            # Log activity
+            cursor.execute(_SQL_LOG_EVENT, ('revision_requested', revision_record.get('content_id'),
+                                            revision_record.get('reviewer'), revision_record.get('notes', '')))
     
     def save_notification(self, notification: dict):
         """Save notification (for future email/Slack integration)"""
@@ -374,27 +981,21 @@ class ContentDatabase:
     def get_revisions_of_content(self, content_id: int) -> List[Dict]:
         """Get all revisions of a specific content"""
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM content 
-            WHERE metadata LIKE ? OR metadata LIKE ?
-            ORDER BY created_at DESC
-        ''', (f'%"revision_of": {content_id}%', f'%"revision_of":"{content_id}"%'))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        result = []
-        for row in rows:
-            content = dict(row)
-            if content.get('metadata'):
-                try:
-                    content['metadata'] = json.loads(content['metadata'])
-                except:
-                    content['metadata'] = {}
-            result.append(content)
-        
-        return result
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # Matches with or without a space after the colon (orjson or stdlib output).
+            # LIKE never matches a BLOB operand, so the bytes are read as text.
+            cursor.execute(f'''
+                SELECT {_LIST_SELECT} FROM content 
+                WHERE CAST(metadata AS TEXT) LIKE '%"revision_of":%'
+                  AND CAST(metadata AS TEXT) LIKE ?
+                ORDER BY created_at DESC
+            ''', (f'%{content_id}%',))
+            
+            rows = cursor.fetchall()
+        
+        # LIKE is only a prefilter: revision_of 1 also matches 10, 11, ...
+        revisions = _rows_to_content(rows)
+        return [rev for rev in revisions
+                if str(rev['metadata'].get('revision_of')) == str(content_id)]
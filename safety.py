@@ -2,7 +2,65 @@ from enum import Enum
 from datetime import datetime
 from typing import Dict, List
 import threading
+import queue
+import time
+import weakref
 import json
+import re
+from collections import deque
+from itertools import islice
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json writes the same lines
+    orjson = None
+
+AUDIT_LOG_PATH = "safety_audit.log"
+
+# The audit writer flushes whenever it catches up with the queue, and at
+# once for HIGH/CRITICAL events so incidents reach disk immediately
+_FLUSH_SEVERITIES = {"HIGH", "CRITICAL"}
+
+# In-memory audit entries kept; the file keeps the full history
+AUDIT_LOG_MAXLEN = 10000
+
+# Words that flag content for review, matched anywhere in the text as before
+ALARM_WORDS = ("emergency", "urgent", "crisis", "breaking",
+               "alert", "immediately", "warning")
+_ALARM_RE = re.compile("|".join(map(re.escape, ALARM_WORDS)), re.IGNORECASE)
+
+def _iso(ts: float) -> str:
+    """Format a time.time() value the way datetime.now().isoformat() does"""
+    return datetime.fromtimestamp(ts).isoformat()
+
+def _public_entry(entry: Dict) -> Dict:
+    """Audit entry as callers and the log file see it, with an ISO timestamp"""
+    public = {"timestamp": _iso(entry["ts"])}
+    public.update((key, value) for key, value in entry.items() if key != "ts")
+    return public
+
+def _encode_entry(entry: Dict) -> bytes:
+    entry = _public_entry(entry)
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return (json.dumps(entry) + "\n").encode()
+
+def _write_audit(audit_queue: queue.SimpleQueue, audit_fh):
+    """Background loop appending queued entries to the audit file"""
+    while True:
+        entry = audit_queue.get()
+        if entry is None:
+            break
+        audit_fh.write(_encode_entry(entry))
+        if entry["severity"] in _FLUSH_SEVERITIES or audit_queue.empty():
+            audit_fh.flush()
+    audit_fh.close()
+
+def _stop_audit_writer(audit_queue: queue.SimpleQueue, audit_writer: threading.Thread):
+    """Write out queued audit entries and close the audit log file"""
+    if audit_writer.is_alive():
+        audit_queue.put(None)
+        audit_writer.join(timeout=5)
 
 class SystemMode(Enum):
     MANUAL_REVIEW = "manual_review"
@@ -16,8 +74,23 @@ class SafetyController:
     def __init__(self):
         self.mode = SystemMode.MANUAL_REVIEW
         self.emergency_stop = False
+        # lock guards mode/emergency_stop transitions; _log_lock guards the
+        # audit deque. A transition logs while still holding lock, so the
+        # audit order matches the order transitions were applied in
         self.lock = threading.Lock()
-        self.audit_log = []
+        self._log_lock = threading.Lock()
+        self.audit_log = deque(maxlen=AUDIT_LOG_MAXLEN)
+        
+        # Entries are encoded and appended to the file by a background
+        # thread, so callers never wait on disk. close() (also run at exit,
+        # or when the controller is collected) drains the queue and closes
+        # the file. Neither holds a reference to the controller.
+        audit_fh = open(AUDIT_LOG_PATH, "ab", buffering=1 << 16)
+        self._audit_queue = queue.SimpleQueue()
+        self._audit_writer = threading.Thread(target=_write_audit, args=(self._audit_queue, audit_fh),
+                                              name="safety-audit", daemon=True)
+        self._audit_writer.start()
+        self._finalizer = weakref.finalize(self, _stop_audit_writer, self._audit_queue, self._audit_writer)
         
         # Safety thresholds
         self.thresholds = {
@@ -35,16 +108,16 @@ class SafetyController:
         with self.lock:
             self.mode = SystemMode.EMERGENCY_STOP
             self.emergency_stop = True
-            
+            state = self._state()
             self._log_event("emergency_pause", reason, "CRITICAL")
-            
-            return {
-                "status": "SYSTEM_HALTED",
-                "timestamp": datetime.now().isoformat(),
-                "reason": reason,
-                "mode": self.mode.value,
-                "instructions": "All automation stopped. Manual intervention required."
-            }
+        
+        return {
+            "status": "SYSTEM_HALTED",
+            "timestamp": datetime.now().isoformat(),
+            "reason": reason,
+            "mode": state[0].value,
+            "instructions": "All automation stopped. Manual intervention required."
+        }
     
     def resume_operations(self) -> Dict:
         """Resume operations after emergency stop"""
@@ -52,14 +125,14 @@ class SafetyController:
         with self.lock:
             self.mode = SystemMode.MANUAL_REVIEW
             self.emergency_stop = False
-            
+            state = self._state()
             self._log_event("resume_operations", "System resumed from emergency stop")
-            
-            return {
-                "status": "OPERATIONAL",
-                "timestamp": datetime.now().isoformat(),
-                "mode": self.mode.value
-            }
+        
+        return {
+            "status": "OPERATIONAL",
+            "timestamp": datetime.now().isoformat(),
+            "mode": state[0].value
+        }
     
     def set_mode(self, mode_str: str):
         """Set system mode"""
@@ -81,30 +154,28 @@ class SafetyController:
         
         with self.lock:
             self.mode = SystemMode.CRISIS_MODE
-            
-            actions = [
-                "Paused all scheduled posts",
-                "Disabled automatic content generation",
-                "Enabled enhanced content review",
-                "Notified security team"
-            ]
-            
             self._log_event("crisis_mode_activated", 
                           f"Crisis mode: {crisis_type}", "HIGH")
-            
-            return {
-                "status": "CRISIS_MODE_ACTIVE",
-                "crisis_type": crisis_type,
-                "actions_taken": actions,
-                "timestamp": datetime.now().isoformat()
-            }
+        
+        actions = [
+            "Paused all scheduled posts",
+            "Disabled automatic content generation",
+            "Enabled enhanced content review",
+            "Notified security team"
+        ]
+        
+        return {
+            "status": "CRISIS_MODE_ACTIVE",
+            "crisis_type": crisis_type,
+            "actions_taken": actions,
+            "timestamp": datetime.now().isoformat()
+        }
     
     def force_manual_review(self):
         """Force all content to manual review"""
         
         with self.lock:
             self.mode = SystemMode.MANUAL_REVIEW
-            
             self._log_event("force_manual_review", 
                           "All content moved to manual review")
     
@@ -113,13 +184,10 @@ class SafetyController:
         
         issues = []
         
-        alarm_words = ["emergency", "urgent", "crisis", "breaking", 
-                      "alert", "immediately", "warning"]
-        
-        content_lower = content.lower()
-        for word in alarm_words:
-            if word in content_lower:
-                issues.append(f"Contains alarming word: '{word}'")
+        # One pass over the text; each word is reported once
+        found = dict.fromkeys(m.group().lower() for m in _ALARM_RE.finditer(content))
+        for word in found:
+            issues.append(f"Contains alarming word: '{word}'")
         
         if len(content) < 20:
             issues.append("Content too short")
@@ -149,24 +217,43 @@ class SafetyController:
     def get_audit_log(self, limit: int = 10) -> List[Dict]:
         """Get recent audit log entries"""
         
-        return self.audit_log[-limit:] if self.audit_log else []
+        # Walk back from the newest entry rather than copying the whole deque
+        with self._log_lock:
+            recent = list(islice(reversed(self.audit_log), max(limit, 0)))
+        recent.reverse()
+        return [_public_entry(entry) for entry in recent]
+    
+    def _state(self):
+        """(mode, emergency_stop) as one snapshot; take it while holding self.lock"""
+        return self.mode, self.emergency_stop
     
     def _log_event(self, event_type: str, description: str, severity: str = "INFO"):
-        """Log safety event"""
+        """Log safety event
+        
+        Transitions call this while holding self.lock, so the recorded mode
+        is the one the event produced.
+        """
         
+        mode, emergency_stop = self._state()
+        
+        # A float is cheap to take; it is formatted only when read or written out
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "ts": time.time(),
             "event": event_type,
             "description": description,
             "severity": severity,
-            "mode": self.mode.value,
-            "emergency_stop": self.emergency_stop
+            "mode": mode.value,
+            "emergency_stop": emergency_stop
         }
         
-        self.audit_log.append(log_entry)
-        
-        with open("safety_audit.log", "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        # Queued under the same lock so the file keeps the deque's order
+        with self._log_lock:
+            self.audit_log.append(log_entry)
+            self._audit_queue.put(log_entry)
+    
+    def close(self):
+        """Write out queued audit entries and close the audit log file"""
+        self._finalizer()
     
     def _calculate_system_score(self) -> int:
         """Calculate overall system safety score"""
@@ -179,7 +266,9 @@ class SafetyController:
     
     def _get_last_incident(self):
         """Get last critical incident"""
-        for log in reversed(self.audit_log):
-            if log["severity"] in ["HIGH", "CRITICAL"]:
-                return log["description"]
+        # Appends would invalidate the iterator, so hold the log lock
+        with self._log_lock:
+            for log in reversed(self.audit_log):
+                if log["severity"] in ["HIGH", "CRITICAL"]:
+                    return log["description"]
         return None
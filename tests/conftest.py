@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The app modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ContentDatabase
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "content.db")
+
+
+@pytest.fixture
+def db(db_path):
+    database = ContentDatabase(db_path)
+    yield database
+    database.close()
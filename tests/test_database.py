@@ -0,0 +1,113 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import ContentDatabase
+
+
+def _create(db, status="draft", topic="topic"):
+    return db.create_content("Twitter", topic, "body", {"tone": "casual"}, status)
+
+
+def test_transaction_rolls_back_on_error(db):
+    kept = _create(db)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            dropped = _create(db)
+            # A nested block joins the outer transaction and rolls back with it
+            with db.transaction():
+                db.update_status(kept, "approved")
+            raise RuntimeError("abort")
+
+    assert db.get_content(dropped) is None
+    assert db.get_status(kept) == "draft"
+
+
+def test_get_content_by_statuses_caps_each_status(db):
+    pending = [_create(db, "pending_approval") for _ in range(5)]
+    approved = [_create(db, "approved") for _ in range(3)]
+    _create(db, "draft")
+
+    buckets = db.get_content_by_statuses({"pending_approval": None, "approved": 2})
+
+    assert set(buckets) == {"pending_approval", "approved"}
+    assert [c["id"] for c in buckets["pending_approval"]] == pending[::-1]
+    assert [c["id"] for c in buckets["approved"]] == approved[::-1][:2]
+    assert "rn" not in buckets["approved"][0]
+
+
+def test_deferred_writes_are_flushed_on_close(db_path):
+    db = ContentDatabase(db_path)
+    for i in range(150):
+        db.defer_write(db.log_activity, "deferred", details=str(i))
+    db.close()
+
+    reopened = ContentDatabase(db_path)
+    try:
+        actions = [a["action"] for a in reopened.get_recent_activities(limit=500)]
+        assert actions.count("deferred") == 150
+    finally:
+        reopened.close()
+
+
+def test_failing_deferred_write_is_dropped_alone(db_path):
+    db = ContentDatabase(db_path)
+
+    def failing_write():
+        db.log_activity("partial", details="rolled back with its savepoint")
+        raise ValueError("bad write")
+
+    db.defer_write(db.log_activity, "before", details="kept")
+    db.defer_write(failing_write)
+    db.defer_write(db.log_activity, "after", details="kept")
+    db.close()
+
+    reopened = ContentDatabase(db_path)
+    try:
+        actions = {a["action"] for a in reopened.get_recent_activities(limit=10)}
+        assert actions == {"before", "after"}
+    finally:
+        reopened.close()
+
+
+def test_claim_due_posts_never_claims_a_post_twice(db_path):
+    # Two database objects stand in for two processes sharing the file
+    first, second = ContentDatabase(db_path), ContentDatabase(db_path)
+    try:
+        now = datetime.now()
+        ids = [_create(first) for _ in range(20)]
+        for content_id in ids:
+            first.schedule_content(content_id, now - timedelta(minutes=1))
+        first.schedule_content(_create(first), now + timedelta(hours=1))
+
+        barrier = threading.Barrier(2)
+        claimed = {}
+
+        def claim(name, db):
+            barrier.wait()
+            claimed[name] = db.claim_due_posts(now)
+
+        threads = [threading.Thread(target=claim, args=(name, db))
+                   for name, db in (("first", first), ("second", second))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        posts = claimed["first"] + claimed["second"]
+        assert sorted(post["content_id"] for post in posts) == ids
+        assert len({post["id"] for post in posts}) == len(ids)
+        assert first.claim_due_posts(now) == []
+    finally:
+        first.close()
+        second.close()
+
+
+def test_update_status_many_handles_more_ids_than_sqlite_variables(db):
+    ids = [_create(db) for _ in range(1200)]
+
+    db.update_status_many(ids, "approved")
+
+    assert len(db.get_content_by_statuses({"approved": None})["approved"]) == len(ids)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from workflow import ApprovalWorkflow
+
+
+def test_apply_decisions_skips_items_already_decided(db):
+    workflow = ApprovalWorkflow(db)
+    pending = db.create_content("Twitter", "pending", "body", {}, "pending_approval")
+    decided = db.create_content("Twitter", "decided", "body", {}, "pending_approval")
+    scheduled = db.create_content("Twitter", "scheduled", "body", {}, "scheduled")
+
+    # Another session approves this one after the queue was read
+    workflow.approve(decided, approver="someone-else")
+
+    applied = workflow.apply_decisions([
+        {"content_id": pending, "action": "approved", "reviewer": "me", "comments": ""},
+        {"content_id": decided, "action": "rejected", "reviewer": "me", "comments": "stale"},
+        {"content_id": scheduled, "action": "rejected", "reviewer": "me", "comments": "stale"},
+        {"content_id": pending, "action": "unknown", "reviewer": "me", "comments": ""},
+    ])
+
+    assert [d["content_id"] for d in applied] == [pending]
+    assert db.get_status(pending) == "approved"
+    assert db.get_status(decided) == "approved"
+    assert db.get_status(scheduled) == "scheduled"
+
+
+def test_apply_decisions_records_one_approval_row_per_applied_decision(db):
+    workflow = ApprovalWorkflow(db)
+    ids = [db.create_content("Blog", f"topic {i}", "body", {}, "pending_approval") for i in range(3)]
+
+    applied = workflow.apply_decisions(
+        [{"content_id": cid, "action": "rejected", "reviewer": "me", "comments": "no"} for cid in ids])
+    # Applying the same batch again finds nothing pending
+    reapplied = workflow.apply_decisions(
+        [{"content_id": cid, "action": "approved", "reviewer": "me", "comments": ""} for cid in ids])
+
+    assert len(applied) == 3
+    assert reapplied == []
+    with db._connection() as conn:
+        rows = conn.execute("SELECT content_id, action FROM approvals ORDER BY content_id").fetchall()
+    assert [tuple(row) for row in rows] == [(cid, "rejected") for cid in ids]
+
+
+def test_rejected_content_is_never_published(db):
+    workflow = ApprovalWorkflow(db)
+    now = datetime.now()
+    content_id = db.create_content("Twitter", "topic", "body", {}, "approved")
+    db.schedule_content(content_id, now - timedelta(minutes=1))
+
+    assert workflow.reject(content_id, "off brand", "reviewer")
+
+    assert db.claim_due_posts(now) == []
+    assert db.get_status(content_id) == "rejected"
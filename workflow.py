@@ -7,8 +7,14 @@ from enum import Enum
 from datetime import datetime
 from typing import Dict, List, Optional
 import uuid
-import json
-import sqlite3
+import threading
+import logging
+from collections import ChainMap
+from contextlib import nullcontext
+from operator import itemgetter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from agents import BrandVoice
 
 class ContentState(Enum):
     DRAFT = "draft"
@@ -21,69 +27,102 @@ class ContentState(Enum):
     PUBLISHED = "published"
     DISCARDED = "discarded"
 
+logger = logging.getLogger(__name__)
+
+# Plain string values for the hot paths, looked up once at import
+_S_PENDING_REVIEW = ContentState.PENDING_REVIEW.value
+_S_PENDING_APPROVAL = ContentState.PENDING_APPROVAL.value
+_S_APPROVED = ContentState.APPROVED.value
+_S_REJECTED = ContentState.REJECTED.value
+_S_NEEDS_REVISION = ContentState.NEEDS_REVISION.value
+
+# Actions apply_decisions accepts
+_DECISION_STATES = frozenset({_S_APPROVED, _S_REJECTED})
+
+# Brand voice fields in BrandVoice order, as stored in content metadata
+_BRAND_VOICE_KEYS = ('company', 'tone', 'personality_traits', 'audience',
+                     'content_pillars', 'forbidden_topics')
+_LIST_FIELDS = frozenset({'personality_traits', 'content_pillars', 'forbidden_topics'})
+_get_brand_voice_fields = itemgetter(*_BRAND_VOICE_KEYS)
+
+# Default values
+_BRAND_VOICE_DEFAULTS = {
+    'company': 'TechInnovate',
+    'tone': 'professional',
+    'personality_traits': ('Expert', 'Innovative'),
+    'audience': 'tech professionals',
+    'content_pillars': ('AI Trends', 'Tech Leadership'),
+    'forbidden_topics': ('politics', 'financial advice'),
+}
+
 class ApprovalWorkflow:
-    def __init__(self, database, ai_agent=None):
+    def __init__(self, database, ai_agent=None, generation_gate=None):
         self.db = database
         self.ai_agent = ai_agent  # AI agent for regeneration
+        # Optional semaphore shared with other AI callers, bounding concurrent model calls
+        self.generation_gate = generation_gate
         self.required_approvers = 1  # Configurable
         self.min_review_time = 30  # Minimum seconds between creation and approval
         
+        # AI revisions run here so request_revision returns without waiting
+        # on the model; in-flight jobs are tracked per content id until they finish
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="revision")
+        self._revision_jobs: Dict[str, Future] = {}
+        self._jobs_lock = threading.Lock()
+        
     def submit_for_approval(self, content_id: str) -> bool:
         """Submit content for approval - HARD GATE"""
         
-        # Get content
-        content = self.db.get_content(content_id)
-        if not content:
-            print(f"Error: Content {content_id} not found")
-            return False
-        
-        # Update state to 'pending_approval' (not 'pending_review')
-        self.db.update_status(content_id, "pending_approval")
-        
-        # Log submission
-        self.db.log_activity(
-            action="submitted_for_approval",
-            details=f"Content {content_id} submitted for approval",
-            content_id=content_id
-        )
+        # The existence check and the status change share one transaction
+        with self.db.transaction():
+            # Only existence matters here, so skip the full row
+            if not self.db.content_exists(content_id):
+                logger.warning("Content %s not found", content_id)
+                return False
+            
+            # Update state to 'pending_approval' (not 'pending_review')
+            self.db.record_workflow_event([
+                ("set_status", (_S_PENDING_APPROVAL, content_id)),
+            ])
+            
+            # Log submission
+            self.db.defer_write(
+                self.db.log_activity,
+                action="submitted_for_approval",
+                content_id=content_id
+            )
         
         # Simulate notification
         self._send_notification(content_id, "submitted")
         
-        print(f"Content {content_id} submitted to approval queue")
+        logger.info("Content %s submitted to approval queue", content_id)
         return True
         
     def approve(self, content_id: str, approver: str, comments: str = "") -> bool:
         """Approve content - explicit human approval required"""
         
-        # Check if content exists
-        content = self.db.get_content(content_id)
-        if not content:
-            return False
-        
-        # Check if already approved
-        if content['status'] == ContentState.APPROVED.value:
-            return True
-        
-        # Update state
-        self.db.update_status(content_id, ContentState.APPROVED.value)
-        
-        # Record approval
-        approval_record = {
-            "approver": approver,
-            "timestamp": datetime.now(),
-            "comments": comments,
-            "content_id": content_id
-        }
-        
-        self.db.record_approval(approval_record)
-        
-        # Log activity
-        self.db.log_activity(
-            action="approved",
-            details=f"Content {content_id} approved by {approver}",
-            content_id=content_id
-        )
+        with self.db.transaction():
+            # Check if content exists and isn't already approved
+            status = self.db.get_status(content_id)
+            if status is None:
+                return False
+            if status == _S_APPROVED:
+                return True
+            
+            # Update state, record the approval and log it in one batch
+            self.db.record_workflow_event([
+                ("set_status", (_S_APPROVED, content_id)),
+                ("insert_approval", (content_id, approver, _S_APPROVED, comments)),
+                ("log_event", ("content_approved", content_id, approver, None)),
+            ])
+            
+            # Log activity
+            self.db.defer_write(
+                self.db.log_activity,
+                action="approved",
+                content_id=content_id,
+                actor=approver
+            )
         
         # Simulate notification
         self._send_notification(content_id, "approved")
@@ -93,84 +132,135 @@ class ApprovalWorkflow:
     def reject(self, content_id: str, reason: str, reviewer: str) -> bool:
         """Reject content - hard stop"""
         
-        # Update state
-        self.db.update_status(content_id, ContentState.REJECTED.value)
-        
-        # Record rejection
-        rejection_record = {
-            "reviewer": reviewer,
-            "reason": reason,
-            "timestamp": datetime.now(),
-            "content_id": content_id
-        }
-        
-        self.db.record_rejection(rejection_record)
-        
-        # Log activity
-        self.db.log_activity(
-            action="rejected",
-            details=f"Content {content_id} rejected: {reason}",
-            content_id=content_id
-        )
+        with self.db.transaction():
+            # Don't record a rejection for an id that doesn't exist
+            if not self.db.content_exists(content_id):
+                logger.warning("Content %s not found", content_id)
+                return False
+            
+            # Update state, record the rejection and log it in one batch
+            self.db.record_workflow_event([
+                ("set_status", (_S_REJECTED, content_id)),
+                # Any post still scheduled for it is dropped
+                ("supersede_posts", (content_id,)),
+                ("insert_approval", (content_id, reviewer, _S_REJECTED, reason)),
+                ("log_event", ("content_rejected", content_id, reviewer, reason)),
+            ])
+            
+            # Log activity
+            self.db.defer_write(
+                self.db.log_activity,
+                action="rejected",
+                content_id=content_id,
+                actor=reviewer,
+                note=reason
+            )
         
         # Simulate notification
         self._send_notification(content_id, "rejected", reason)
         
         return True
     
+    def apply_decisions(self, decisions: List[Dict]) -> List[Dict]:
+        """Apply queued approve/reject decisions with a single database commit
+        
+        Each decision is {"content_id", "action", "reviewer", "comments"}
+        where action is "approved" or "rejected"; any other action is logged
+        and ignored. Items that are no longer pending approval (decided
+        elsewhere since the queue was read) are skipped. Returns the
+        decisions that were applied.
+        """
+        
+        valid = [d for d in decisions if d['action'] in _DECISION_STATES]
+        if len(valid) != len(decisions):
+            logger.warning("Ignored decisions with unknown actions: %s",
+                           [(d['content_id'], d['action']) for d in decisions
+                            if d['action'] not in _DECISION_STATES])
+        
+        skipped = self.db.record_decisions(valid)
+        if skipped:
+            logger.warning("Skipped decisions for content no longer pending approval: %s", skipped)
+            skipped = set(skipped)
+            valid = [d for d in valid if d['content_id'] not in skipped]
+        
+        # One clock read stamps the whole batch
+        now_iso = datetime.now().isoformat()
+        for decision in valid:
+            extra = decision.get('comments', '') if decision['action'] == _S_REJECTED else ""
+            self._send_notification(decision['content_id'], decision['action'], extra, now_iso)
+        
+        return valid
+    
     def request_revision(self, content_id: str, notes: str, reviewer: str) -> bool:
         """Send content back for AI revision - ACTUALLY REGENERATE"""
         
-        # Get the original content
-        content = self.db.get_content(content_id)
-        if not content:
-            print(f"Error: Content {content_id} not found for revision")
+        # Get the original content; without an agent there is nothing to
+        # regenerate, so only its existence is checked
+        if self.ai_agent:
+            content = self.db.get_content(content_id)
+            found = content is not None
+        else:
+            found = self.db.content_exists(content_id)
+        if not found:
+            logger.warning("Content %s not found for revision", content_id)
             return False
         
-        print(f"Revision requested for content {content_id}")
-        print(f"   Reviewer notes: {notes}")
-        
-        # Update state
-        self.db.update_status(content_id, "needs_revision")
-        
-        # Record revision request
-        revision_record = {
-            "reviewer": reviewer,
-            "notes": notes,
-            "timestamp": datetime.now(),
-            "content_id": content_id
-        }
-        
-        self.db.record_revision_request(revision_record)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Revision requested for content %s\n   Reviewer notes: %s", content_id, notes)
         
-        # Log activity
-        self.db.log_activity(
-            action="revision_requested",
-            details=f"Content {content_id} needs revision: {notes[:50]}...",
-            content_id=content_id
-        )
+        # The request commits before regeneration, so the write lock is
+        # never held across the AI call; its log_event row is the one
+        # revision_requested activity entry
+        self.db.record_workflow_event([
+            ("set_status", (_S_NEEDS_REVISION, content_id)),
+            ("insert_approval", (content_id, reviewer, "revision_requested", notes)),
+            ("log_event", ("revision_requested", content_id, reviewer, notes)),
+        ])
         
-        # ACTUAL AI REGENERATION WITH FEEDBACK
+        # ACTUAL AI REGENERATION WITH FEEDBACK, off the request path: the
+        # reviewer gets an answer now and the new draft appears when ready
         if self.ai_agent:
-            try:
-                print("Regenerating content with AI based on feedback...")
-                
-                # Extract original parameters
-                original_topic = content.get('topic', '')
-                original_platform = content.get('platform', '')
-                
-                # Get metadata for brand voice
-                metadata = content.get('metadata', {})
-                if isinstance(metadata, str):
-                    try:
-                        metadata = json.loads(metadata)
-                    except:
-                        metadata = {}
-                
-                # Create enhanced prompt with revision feedback
-                enhanced_topic = f"{original_topic} - REVISION REQUESTED: {notes}"
-                
-                # Generate revised content
+            with self._jobs_lock:
+                job = self._executor.submit(self._perform_ai_revision, content_id, content, notes, reviewer)
+                self._revision_jobs[content_id] = job
+            # Outside the lock: a job that already finished runs the callback here
+            job.add_done_callback(lambda done: self._forget_revision_job(content_id, done))
+        else:
+            logger.info("AI agent not available for regeneration; "
+                        "in production, this would trigger AI to regenerate content.")
+        
+        return True
+    
+    def is_revision_running(self, content_id: str) -> bool:
+        """Whether an AI revision of this content is still being generated"""
+        with self._jobs_lock:
+            return content_id in self._revision_jobs
+    
+    def _forget_revision_job(self, content_id: str, job: Future):
+        """Drop a finished job, unless a newer request has replaced it"""
+        with self._jobs_lock:
+            if self._revision_jobs.get(content_id) is job:
+                del self._revision_jobs[content_id]
+    
+    def _perform_ai_revision(self, content_id: str, content: Dict, notes: str,
+                             reviewer: str) -> Optional[int]:
+        """Regenerate content from reviewer notes; returns the new draft's id, or None on failure"""
+        
+        try:
+            logger.info("Regenerating content %s with AI based on feedback", content_id)
+            
+            # Extract original parameters
+            original_topic = content.get('topic', '')
+            original_platform = content.get('platform', '')
+            
+            # Get metadata for brand voice (get_content has already decoded it)
+            metadata = content['metadata']
+            
+            # Create enhanced prompt with revision feedback
+            enhanced_topic = f"{original_topic} - REVISION REQUESTED: {notes}"
+            
+            # Generate revised content, within the shared generation limit
+            with self.generation_gate or nullcontext():
                 revised_result = self.ai_agent.generate_content(
                     platform=original_platform,
                     topic=enhanced_topic,
@@ -180,7 +270,10 @@ class ApprovalWorkflow:
                     include_question=True,
                     call_to_action=None
                 )
-                
+            
+            # The new version and the marker on the original commit
+            # together; the log entries follow on the background writer
+            with self.db.transaction():
                 # Create new content entry for revised version
                 revised_content_id = self.db.create_content(
                     platform=original_platform,
@@ -198,103 +291,74 @@ class ApprovalWorkflow:
                 )
                 
                 # Also add revision marker to original content
-                original_metadata = content.get('metadata', {})
-                if isinstance(original_metadata, str):
-                    try:
-                        original_metadata = json.loads(original_metadata)
-                    except:
-                        original_metadata = {}
-                
-                original_metadata['has_revisions'] = True
-                original_metadata['latest_revision'] = revised_content_id
+                metadata['has_revisions'] = True
+                metadata['latest_revision'] = revised_content_id
                 
                 # Update original metadata
-                conn = sqlite3.connect(self.db.db_path)
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE content SET metadata = ? WHERE id = ?",
-                    (json.dumps(original_metadata), content_id)
-                )
-                conn.commit()
-                conn.close()
+                self.db.update_metadata(content_id, metadata)
                 
                 # Log the regeneration
-                self.db.log_activity(
+                self.db.defer_write(
+                    self.db.log_activity,
                     action="content_regenerated",
-                    details=f"Content {content_id} regenerated as {revised_content_id} based on revision notes",
-                    content_id=revised_content_id
+                    content_id=revised_content_id,
+                    actor=reviewer,
+                    note=str(content_id)
                 )
                 
-                print(f"Revised content created: ID {revised_content_id}")
-                print(f"   Original: {content_id}")
-                print(f"   New version: {revised_content_id}")
-                
                 # Update original content to reference revision
-                self.db.log_activity(
+                self.db.defer_write(
+                    self.db.log_activity,
                     action="revision_created",
-                    details=f"New version {revised_content_id} created from revision of {content_id}",
-                    content_id=content_id
+                    content_id=content_id,
+                    actor=reviewer,
+                    note=str(revised_content_id)
                 )
-                
-                return True
-                
-            except Exception as e:
-                print(f"AI regeneration failed: {e}")
-                # Still record the revision request even if regeneration fails
-                return True
-        else:
-            print("AI agent not available for regeneration")
-            print("   In production, this would trigger AI to regenerate content.")
-            return True
+            
+            logger.info("Revised content created: ID %s (original %s)", revised_content_id, content_id)
+            
+            return revised_content_id
+            
+        except Exception:
+            logger.exception("AI regeneration failed for content %s", content_id)
+            # The revision request itself is already recorded
+            return None
         
     def _get_brand_voice_from_metadata(self, metadata: Dict) -> object:
         """Create BrandVoice object from metadata"""
-        from agents import BrandVoice
         
-        # Default values
-        company_name = metadata.get('company', 'TechInnovate')
-        tone = metadata.get('tone', 'professional')
-        personality_traits = metadata.get('personality_traits', ['Expert', 'Innovative'])
-        target_audience = metadata.get('audience', 'tech professionals')
-        content_pillars = metadata.get('content_pillars', ['AI Trends', 'Tech Leadership'])
-        forbidden_topics = metadata.get('forbidden_topics', ['politics', 'financial advice'])
+        values = _get_brand_voice_fields(ChainMap(metadata, _BRAND_VOICE_DEFAULTS))
         
-        # Ensure lists
-        if isinstance(personality_traits, str):
-            personality_traits = [personality_traits]
-        if isinstance(content_pillars, str):
-            content_pillars = [content_pillars]
-        if isinstance(forbidden_topics, str):
-            forbidden_topics = [forbidden_topics]
+        # Ensure lists; each call gets its own, so no caller shares them
+        return BrandVoice(*(
+            ([value] if isinstance(value, str) else list(value)) if key in _LIST_FIELDS else value
+            for key, value in zip(_BRAND_VOICE_KEYS, values)
+        ))
         
-        return BrandVoice(
-            company_name=company_name,
-            tone=tone,
-            personality_traits=personality_traits,
-            target_audience=target_audience,
-            content_pillars=content_pillars,
-            forbidden_topics=forbidden_topics
-        )
+    def _send_notification(self, content_id: str, action: str, extra_info: str = "",
+                           now_iso: Optional[str] = None):
+        """Simulate notification system
         
-    def _send_notification(self, content_id: str, action: str, extra_info: str = ""):
-        """Simulate notification system"""
-        print(f"NOTIFICATION: Content {content_id} was {action}. {extra_info}")
+        now_iso lets a caller sending several notifications stamp them all
+        with one timestamp instead of reading the clock for each.
+        """
+        logger.info("NOTIFICATION: Content %s was %s. %s", content_id, action, extra_info)
         
         # In production: Send email/Slack/webhook
         notification = {
             "content_id": content_id,
             "action": action,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso or datetime.now().isoformat(),
             "extra_info": extra_info
         }
         
-        # Save notification for UI
-        self.db.save_notification(notification)
+        # Save notification for UI; delivery doesn't hold up the caller
+        self.db.defer_write(self.db.save_notification, notification)
     
     def get_approval_queue(self) -> List[Dict]:
         """Get all content pending approval"""
-        return self.db.get_content_by_status(ContentState.PENDING_APPROVAL.value)
+        return self.db.get_content_by_status(_S_PENDING_APPROVAL)
     
     def get_review_queue(self) -> List[Dict]:
         """Get all content pending review"""
-        return self.db.get_content_by_status(ContentState.PENDING_REVIEW.value)
+        return self.db.get_content_by_status(_S_PENDING_REVIEW)